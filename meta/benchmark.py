@@ -0,0 +1,372 @@
+from __future__ import annotations
+
+import gc
+import json
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from argparse import ArgumentParser
+from collections.abc import Callable, Iterator
+from contextlib import AbstractContextManager, contextmanager
+from datetime import date, timedelta
+from itertools import accumulate
+from pathlib import Path
+from typing import Any
+
+import yaml
+
+from builder import (ScriptContext, iter_script_fragments, make_fill_data, published_scripts, render_all_fills,
+                     render_index)
+from facet_index import make_facet_index
+from outputs import write_text
+from parser import parse
+from search_index import make_search_index
+from update_json import dump_json, load_data
+
+try:
+    from yaml import CSafeDumper as SafeDumper
+except ImportError:
+    from yaml import SafeDumper
+
+TEMPLATE_ROOT = Path(__file__).parent / "templates"
+
+# the catalog sizes which can be benchmarked, and those which are by default
+SIZES = (100, 1_000, 10_000, 100_000)
+DEFAULT_SIZES = (100, 1_000, 10_000)
+
+# the stages of the build which are timed, in order
+STAGES = ("load_data", "write_json", "parse", "script_context", "fill_data", "indexes", "render", "write")
+
+# a stage is only a regression if it is slower than its baseline by both this fraction and this many seconds (or for
+# memory, bytes), so that noise in the fastest stages does not fail the run
+DEFAULT_TOLERANCE = 0.2
+MIN_SECONDS = 0.01
+MIN_BYTES = 1 << 20
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# synthetic catalogs
+#
+# The distributions below are modelled on the real catalog: most scripts are single-speaker with a handful of tags
+# drawn from a long-tailed vocabulary, a fifth are part of a series, and the number of fills per script falls off
+# quickly, with a few popular VAs making most of them.
+# ----------------------------------------------------------------------------------------------------------------------
+AUDIENCES = {"F4A": 30, "F4F": 25, "A4A": 7, "M4A": 7, "FF4A": 5, "FF4F": 3, "F4TF": 3, "FFF4A": 2, "FTM4A": 1,
+             "FF4TF": 1}
+SPEAKER_COUNTS = {1: 70, 2: 22, 3: 5, 4: 3}
+FILL_COUNTS = {0: 21, 1: 28, 2: 12, 3: 14, 4: 8, 5: 10, 6: 4, 7: 2, 8: 1}
+CREATOR_COUNTS = {1: 93, 2: 5, 3: 1, 4: 1}
+SUBREDDITS = ("r/ASMRScriptHaven", "r/talkingtalltales", "r/pillowtalkaudio", "r/GWASapphic", "r/SapphicScriptGuild",
+              "r/lgbtpillowtalkaudio")
+
+WORDS = ("amber", "autumn", "bakery", "blanket", "candle", "castle", "cozy", "dragon", "dream", "evening", "fairy",
+         "forest", "garden", "gentle", "girlfriend", "harbour", "healer", "hearth", "knight", "lantern", "library",
+         "meadow", "moon", "neko", "ocean", "princess", "quiet", "rain", "river", "rogue", "sleepy", "snow", "spell",
+         "star", "storm", "tavern", "tea", "tower", "velvet", "village", "warm", "whisper", "winter", "witch")
+TAG_ROLES = ("speaker", "listener", "")
+NAMES = ("Ava", "Clara", "Iris", "Luna", "Mira", "Nora", "Rosa", "Sage", "Tess", "Vera", "Wren", "Zoe")
+
+ANCHOR_DATE = date(2025, 1, 1)
+
+
+def _weighted(rng: random.Random, weights: dict[Any, int]) -> Any:
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+
+def _zipf_picker(rng: random.Random, population: list[str]) -> Callable[[int], list[str]]:
+    """Return a function picking k distinct items from the population, with a long-tailed (Zipf) distribution."""
+    cumulative = list(accumulate(1 / (rank + 1) for rank in range(len(population))))
+
+    def pick(k: int) -> list[str]:
+        chosen: dict[str, None] = {}
+        while len(chosen) < min(k, len(population)):
+            chosen.update(dict.fromkeys(rng.choices(population, cum_weights=cumulative, k=k - len(chosen))))
+        return list(chosen)
+
+    return pick
+
+
+def _text(rng: random.Random, n: int) -> str:
+    return " ".join(rng.choices(WORDS, k=n))
+
+
+def _slug(rng: random.Random, n: int) -> str:
+    return "".join(rng.choices("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789", k=n))
+
+
+def _make_fill(rng: random.Random, script: dict[str, Any], pick_vas: Callable[[int], list[str]]) -> dict[str, Any]:
+    links: dict[str, str] = {}
+    if rng.random() < 0.9:
+        links["YouTube"] = f"https://www.youtube.com/watch?v={_slug(rng, 11)}"
+    if rng.random() < 0.18 or not links:
+        links["soundgasm"] = f"https://soundgasm.net/u/{_slug(rng, 8)}/{_slug(rng, 12)}"
+    if rng.random() < 0.1:
+        links["Patreon"] = f"https://www.patreon.com/posts/{rng.randrange(10**8)}"
+    if rng.random() < 0.15:
+        links[rng.choice(SUBREDDITS)] = f"https://www.reddit.com/r/x/comments/{_slug(rng, 7)}/"
+
+    minutes, seconds = rng.randrange(8, 75), rng.randrange(60)
+    duration = f"{minutes // 60}h{minutes % 60}m{seconds}s" if minutes >= 60 else f"{minutes}m{seconds}s"
+
+    fill: dict[str, Any] = {
+        "creators": pick_vas(_weighted(rng, CREATOR_COUNTS)),
+        "title": f"[{script['audience'][0]}] {script['title']} [{_text(rng, 1).title()}]",
+        "audience": script["audience"][0],
+        "links": links,
+        "date": script["published"] + timedelta(days=rng.randrange(1, 400)),
+        "duration": duration,
+    }
+
+    if rng.random() < 0.09:
+        fill["label"] = _text(rng, 3)
+
+    if rng.random() < 0.01:
+        fill["private"] = True
+
+    return fill
+
+
+def make_catalog(size: int, *, seed: int = 0) -> dict[str, list[dict[str, Any]]]:
+    """Return a synthetic source catalog (as read from the source .yaml file) of the given number of scripts."""
+    rng = random.Random(f"{seed}:{size}")
+
+    tags = [f"{a} {b} {role}".strip() for a in WORDS for b in WORDS[::3] for role in TAG_ROLES][:max(300, size // 10)]
+    rng.shuffle(tags)
+    pick_tags = _zipf_picker(rng, tags)
+    pick_vas = _zipf_picker(rng, [f"{rng.choice(NAMES)} {_slug(rng, 4)} VA" for _ in range(max(50, size // 3))])
+
+    scripts: list[dict[str, Any]] = []
+    series_left = 0
+    series: dict[str, Any] | None = None
+
+    for _ in range(size):
+        if series_left == 0:
+            series = None
+            if rng.random() < 0.08:
+                series_left = rng.randrange(2, 6)
+                series = {"title": _text(rng, 3).title(), "index": 0}
+
+        if series is not None:
+            series = {"title": series["title"], "index": series["index"] + 1}
+            series_left -= 1
+
+        finished = ANCHOR_DATE - timedelta(days=rng.randrange(30, 5 * 365))
+        published = None if rng.random() < 0.03 else finished + timedelta(days=rng.randrange(0, 30))
+        speakers = rng.sample(NAMES, _weighted(rng, SPEAKER_COUNTS))
+        spoken = {name: rng.randrange(1500, 12000) // len(speakers) for name in speakers}
+
+        post = {subreddit: f"https://www.reddit.com/{subreddit}/comments/{_slug(rng, 7)}/"
+                for subreddit in rng.sample(SUBREDDITS, rng.randrange(1, 4))}
+
+        script: dict[str, Any] = {
+            "title": _text(rng, rng.randrange(3, 8)).title(),
+            "audience": [_weighted(rng, AUDIENCES)],
+            "tags": (["18+"] if rng.random() < 0.1 else []) + pick_tags(min(30, int(rng.lognormvariate(2, 0.35)))),
+            "series": series,
+            "summary": _text(rng, rng.randrange(40, 200)).capitalize() + ".",
+            "words": {"spoken": spoken, "total": sum(spoken.values()) + rng.randrange(100, 4000)},
+            "finished": finished,
+            "published": published,
+            "links": {
+                "script": {
+                    "scriptbin": f"https://scriptbin.works/s/{_slug(rng, 5)}",
+                    "Google Docs": f"https://docs.google.com/document/d/{_slug(rng, 44)}/edit?usp=sharing",
+                },
+                "post": post,
+            },
+            "attendant VA": pick_vas(1) if rng.random() < 0.03 else None,
+        }
+
+        if published is not None:
+            script["fills"] = [_make_fill(rng, script, pick_vas) for _ in range(_weighted(rng, FILL_COUNTS))]
+        else:
+            script["fills"] = []
+
+        scripts.append(script)
+
+    return {"scripts": scripts, "audios": []}
+
+
+def write_catalog(catalog: dict[str, list[dict[str, Any]]], path: Path) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        yaml.dump(catalog, f, Dumper=SafeDumper, allow_unicode=True, sort_keys=False)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# measurement
+# ----------------------------------------------------------------------------------------------------------------------
+type Stage = Callable[[str], AbstractContextManager[None]]
+
+
+def run_pipeline(source: Path, workdir: Path, stage: Stage) -> None:
+    """Build the site from the given source into the working directory, running each stage within stage(name)."""
+    with stage("load_data"):
+        data = load_data(source, use_cache=False)
+
+    # (all of the outputs are scratch files, so they are not tracked in the build manifest)
+    datafile = workdir / "script-data.json"
+    with stage("write_json"):
+        dump_json(data, datafile, tracked=False)
+
+    with stage("parse"):
+        scripts = published_scripts(parse(datafile))
+
+    with stage("script_context"):
+        context = ScriptContext.from_scripts(scripts)
+
+    with stage("fill_data"):
+        fills = make_fill_data(context.scripts)
+
+    with stage("indexes"):
+        search_index = json.dumps(make_search_index(context.scripts), separators=(",", ":"))
+        facet_index = json.dumps(make_facet_index(context.scripts), separators=(",", ":"))
+
+    with stage("render"):
+        fragments = iter_script_fragments(context.scripts, TEMPLATE_ROOT / "index")
+        index = "".join(render_index(context, TEMPLATE_ROOT / "index", fragments, chunks=[],
+                                     search_index="search.json", facet_index="facets.json"))
+        all_fills = "".join(render_all_fills(fills, TEMPLATE_ROOT / "fills"))
+
+    with stage("write"):
+        write_text(search_index, workdir / "search.json", tracked=False)
+        write_text(facet_index, workdir / "facets.json", tracked=False)
+        write_text(index, workdir / "index.html", tracked=False)
+        write_text(all_fills, workdir / "all-fills.html", tracked=False)
+
+
+def time_stages(source: Path, workdir: Path, repeat: int) -> dict[str, float]:
+    """Return the best time of each stage over the given number of runs."""
+    best: dict[str, float] = {}
+
+    @contextmanager
+    def stage(name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        yield
+        elapsed = time.perf_counter() - start
+        best[name] = min(best.get(name, elapsed), elapsed)
+
+    for _ in range(repeat):
+        gc.collect()
+        run_pipeline(source, workdir, stage)
+
+    return best
+
+
+def trace_stages(source: Path, workdir: Path) -> dict[str, int]:
+    """Return the peak memory allocated by each stage, over and above what was allocated when it began.
+    This is measured on a separate run, since tracing allocations slows everything down."""
+    peaks: dict[str, int] = {}
+
+    @contextmanager
+    def stage(name: str) -> Iterator[None]:
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+        yield
+        _, peak = tracemalloc.get_traced_memory()
+        peaks[name] = peak - base
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        run_pipeline(source, workdir, stage)
+    finally:
+        tracemalloc.stop()
+
+    return peaks
+
+
+def run_benchmarks(sizes: list[int], *, seed: int, repeat: int, memory: bool) -> dict[str, Any]:
+    """Benchmark each stage of the build on a synthetic catalog of each size, returning the results."""
+    results: dict[str, dict[str, dict[str, float | int]]] = {}
+
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            workdir = Path(tmp)
+            source = workdir / "scripts.yaml"
+            write_catalog(make_catalog(size, seed=seed), source)
+
+            times = time_stages(source, workdir, repeat)
+            peaks = trace_stages(source, workdir) if memory else {}
+
+        results[str(size)] = {name: {"seconds": times[name]} | ({"peak_bytes": peaks[name]} if memory else {})
+                              for name in STAGES}
+        print_results(size, results[str(size)])
+
+    return {
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "seed": seed,
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def print_results(size: int, stages: dict[str, dict[str, float | int]]) -> None:
+    print(f"{size:,} scripts")
+    for name, result in stages.items():
+        memory = f"{result['peak_bytes'] / (1 << 20):10.1f} MiB" if "peak_bytes" in result else ""
+        print(f"    {name:<16}{result['seconds']:10.3f} s{memory}")
+
+
+def find_regressions(report: dict[str, Any], baseline: dict[str, Any], *,
+                     tolerance: float = DEFAULT_TOLERANCE) -> list[str]:
+    """Return a description of every stage (at any size in both) which is slower or uses more memory than its
+    baseline, beyond the given tolerance."""
+    regressions: list[str] = []
+
+    for size, stages in report["results"].items():
+        for name, result in stages.items():
+            base = baseline["results"].get(size, {}).get(name)
+            if base is None:
+                continue
+
+            for measure, minimum in (("seconds", MIN_SECONDS), ("peak_bytes", MIN_BYTES)):
+                if measure not in result or measure not in base:
+                    continue
+
+                now, before = result[measure], base[measure]
+                if now > before * (1 + tolerance) and now - before > minimum:
+                    regressions.append(f"{name} ({int(size):,} scripts): {measure} {before:,.3f} -> {now:,.3f}")
+
+    return regressions
+
+
+def main():
+    parser = ArgumentParser(description="Benchmark each stage of the build on synthetic catalogs.")
+    parser.add_argument("--sizes", type=int, nargs="+", choices=SIZES, default=list(DEFAULT_SIZES), metavar="N",
+                        help=f"the catalog sizes to benchmark, from {', '.join(map(str, SIZES))}")
+    parser.add_argument("--seed", type=int, default=0, help="the seed for the synthetic catalogs")
+    parser.add_argument("--repeat", type=int, default=3, help="time each stage as the best of this many runs")
+    parser.add_argument("--no-memory", action="store_true", help="skip measuring peak memory (which needs another run)")
+    parser.add_argument("-o", "--out-file", type=Path, help="write the results to this .json file")
+    parser.add_argument("--baseline", type=Path, help="compare against the results in this .json file")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="the fraction by which a stage may exceed its baseline before it is a regression")
+    args = parser.parse_args()
+
+    if args.repeat < 1:
+        parser.error("--repeat must be positive")
+
+    report = run_benchmarks(args.sizes, seed=args.seed, repeat=args.repeat, memory=not args.no_memory)
+
+    if args.out_file is not None:
+        args.out_file.write_text(json.dumps(report, indent=4), encoding="utf-8")
+
+    if args.baseline is None:
+        return
+
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+    if regressions := find_regressions(report, baseline, tolerance=args.tolerance):
+        print("regressions against the baseline:")
+        for regression in regressions:
+            print(f"    {regression}")
+        sys.exit(1)
+
+    print("no regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+from argparse import ArgumentParser
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Any
+
+import instrumentation
+from builder import add_build_arguments, build_pages, get_build_options, prepare_scripts_and_audios
+from parser import SourceData, decode_source
+from update_json import JSON_MODES, dump_json, read_source, remove_unpublished
+
+
+def decode_published(source: Mapping[str, list[dict[str, Any]]], *, strict_dates: bool = False) -> SourceData:
+    """Decode the published scripts and the audios straight from the source data, dates and all, exactly as if they
+    had been written to the .json file and read back in."""
+    public = {"scripts": remove_unpublished(source["scripts"]), "audios": source["audios"]}
+    return decode_source(public, strict_dates=strict_dates)
+
+
+def main():
+    parser = ArgumentParser(description="Build the site directly from the source .yaml file.")
+    parser.add_argument("-i", "-y", "--in-file", type=Path, help="the source .yaml file to read", required=True)
+    parser.add_argument("-o", "--out-file", type=Path,
+                        help="if given, also write the .json file here (as update_json.py would)")
+    parser.add_argument("-p", "--private", type=Path, help="the output path for the private .json file")
+    parser.add_argument("--json-mode", choices=JSON_MODES, default="pretty",
+                        help="how to write the .json files: pretty-printed (the default), compactly, or as NDJSON")
+    parser.add_argument("--no-source-cache", action="store_true",
+                        help="always parse the source file, rather than reusing its cached parse if it is unchanged")
+    add_build_arguments(parser)
+    args = parser.parse_args()
+
+    if args.private is not None and args.out_file is None:
+        parser.error("--private requires --out-file")
+
+    options = get_build_options(parser, args)
+
+    with instrumentation.session(args.report, profile=args.profile):
+        source, how = read_source(args.in_file, use_cache=not args.no_source_cache)
+        print(f"{args.in_file}: {how}")
+
+        # the .json file is written first, so that it is precompressed along with the pages
+        if args.out_file is not None:
+            dump_json(source, args.out_file, args.private, mode=args.json_mode)
+
+        scripts, audios = prepare_scripts_and_audios(decode_published(source, strict_dates=args.strict_dates))
+        build_pages(scripts, audios, options=options)
+
+    print(f"outputs: {instrumentation.outputs_summary()}")
+    print(f"build report written to {args.report}")
+
+
+if __name__ == "__main__":
+    main()
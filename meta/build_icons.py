@@ -1,16 +1,8 @@
 from typing import Literal
 
+from links import icon_classes
 from parser import FillData
 
-LINK_ICONS = {
-    "YouTube": ("fa-brands", "fa-youtube"),
-    "soundgasm": ("fa-solid", "fa-headphones"),
-    "Patreon": ("fa-brands", "fa-patreon"),
-    "Reddit": ("fa-brands", "fa-reddit-alien"),
-    "Google Docs": ("fa-brands", "fa-google-drive"),
-    "scriptbin": ("fa-solid", "fa-file-lines")
-}
-
 
 def icon(*fa_classes: str, direction: Literal["left", "right"]) -> str:
     """Create a font awesome icon."""
@@ -38,14 +30,7 @@ def make_header_icons(fill: FillData, attendant_va: list[str] | None) -> str:
 
 
 def get_link_icon_classes(label: str) -> tuple[str, ...]:
-    if label.startswith("r/") or label.startswith("u/"):
-        return LINK_ICONS["Reddit"]
-
-    for key, value in LINK_ICONS.items():
-        if label.startswith(key):
-            return value
-
-    raise ValueError(f"unknown label: {label}")
+    return icon_classes(label)
 
 
 def make_link_icon(label: str) -> str:
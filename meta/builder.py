@@ -1,19 +1,34 @@
 from __future__ import annotations
 
 import json
-import re
+import multiprocessing
+import time
+from argparse import ArgumentParser, Namespace
 from collections.abc import Collection, Iterable, Iterator
-from dataclasses import asdict, dataclass, field
-from datetime import date, datetime, timedelta
-from operator import attrgetter
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field, fields
+from datetime import date, timedelta
+from functools import lru_cache, partial
+from itertools import islice
 from pathlib import Path
-from typing import Self
-
-import jinja2
-
-from build_icons import get_link_icon_classes
-from custom_filters import add_all_filters, any_nsfw
-from parser import FillData, Script, ScriptFingerprint, SeriesData, WordCountData, parse
+from typing import Any, Self
+
+from markupsafe import Markup
+
+import instrumentation
+from catalog import Catalog, published_scripts
+from catalog_db import CATALOG_DB, export_catalog
+from cache import CACHE_DIR, FragmentCache, digest_files
+from compress import precompress, remove_stale_siblings
+from custom_filters import (any_nsfw, format_timedelta, join_content_tags, script_classes, script_tag_classes,
+                            serialise, summarise_gender)
+from environment import get_environment
+from facet_index import make_facet_index
+from links import classify_link
+from minify import minify_stream
+from outputs import recording_outputs, remove_output, write_stream, write_text
+from parser import FillData, Script, ScriptFingerprint, SeriesData, SourceData, WordCountData, load
+from search_index import make_search_index
 
 
 def reverse_enumerate[T](seq: Collection[T], *, start: int = 1) -> Iterator[tuple[int, T]]:
@@ -23,43 +38,51 @@ def reverse_enumerate[T](seq: Collection[T], *, start: int = 1) -> Iterator[tupl
         yield i, item
 
 
-def count_speakers(audience_tag: str) -> int:
-    """Determine the number of speakers specified in the audience tag."""
-    matches = re.findall(r"TM|TF|TA|NB|M|F|A", audience_tag.split("4")[0])
-    return len(matches)
+def prepare_scripts_and_audios(data: SourceData) -> tuple[list[Script], list[EFillData]]:
+    """Return the published scripts and the audios from the decoded data."""
+    return published_scripts(data.scripts), [EFillData.from_fill_data(f) for f in data.audios]
 
 
-def load_scripts() -> list[Script]:
-    """Return a list of the scripts loaded from the file."""
+def load_scripts_and_audios(*, strict_dates: bool = False) -> tuple[list[Script], list[EFillData]]:
+    """Return the published scripts and the audios, decoded from a single read of the data file."""
     datafile = Path(__file__).parent.parent / "script-data.json"
-    scripts = parse(datafile)
+    return prepare_scripts_and_audios(load(datafile, strict_dates=strict_dates))
 
-    # filter to only published scripts
-    scripts = [s for s in scripts if s.published is not None and s.published <= datetime.today()]
-    return sorted(scripts, key=attrgetter("published"), reverse=True)
 
+# how dates are shown on the pages, e.g. 01 Feb 2024
+DISPLAY_DATE_FORMAT = "%d %b %Y"
 
-def load_audios() -> list[EFillData]:
-    datafile = Path(__file__).parent.parent / "script-data.json"
-    data = json.loads(datafile.read_text(encoding="utf-8"))
 
-    fills = [FillData.from_dict(fill) for fill in data["audios"]]
-    return [EFillData.from_fill_data(f) for f in fills]
+@lru_cache(maxsize=4096)
+def display_date(d: date) -> str:
+    return d.strftime(DISPLAY_DATE_FORMAT)
 
 
-@dataclass
+# ----------------------------------------------------------------------------------------------------------------------
+# view models
+#
+# Everything the templates derive from the data (ids, CSS classes, formatted dates, ...) is computed once, as each view
+# model is built, so that the templates only look up attributes. The derivations which see the same input over and
+# over (tags, audience strings, dates) are memoized.
+# ----------------------------------------------------------------------------------------------------------------------
+@dataclass(slots=True)
 class ELinkData:
     href: str
     label: str
     icons: str = field(init=False)
+    embed: str | None = field(init=False)
+    primary: bool = field(init=False)
 
     def __post_init__(self):
-        self.icons = " ".join(get_link_icon_classes(self.label))
+        link_class = classify_link(self.label, self.href)
+        self.icons = " ".join(link_class.icons)
+        self.embed = link_class.embed
+        self.primary = link_class.primary
 
 
-@dataclass
+@dataclass(slots=True)
 class EFillData:
-    creators: list[str]
+    creators: tuple[str, ...]
     title: str
     audience: str
     date: date
@@ -67,20 +90,33 @@ class EFillData:
     links: list[ELinkData]
     label: str | None
     script: ScriptFingerprint
-    index: int | None = None
+    # the fill's number and classes on the all-fills page, which the script fragments on the index page (whose cache
+    # keys are the reprs of their view models) do not depend on
+    index: int | None = field(default=None, repr=False)
     private: bool = False
-    additional_classes: list[str] = field(default_factory=list)
+    additional_classes: list[str] = field(default_factory=list, repr=False)
+    # whether the fill is by one of its script's attendant VAs
+    attendant: bool = False
     embed: str | None = field(init=False)
+    self_filled: bool = field(init=False)
+    gender: str = field(init=False)
+    date_display: str = field(init=False)
+    duration_display: str = field(init=False)
+    script_id: str = field(init=False)
+    classes: str = field(init=False, repr=False)
 
     def __post_init__(self):
-        if self.links and (match := re.search(r"youtube\.com/watch\?v=([^&]+)|youtu\.be/([^&]+)", self.links[0].href)):
-            self.embed = f"https://www.youtube.com/embed/{match.group(1) if match.group(1) else match.group(2)}"
-        else:
-            self.embed = None
+        self.embed = self.links[0].embed if self.links else None
+        self.self_filled = "lilellia" in self.creators
+        self.gender = summarise_gender(self.audience)
+        self.date_display = display_date(self.date)
+        self.duration_display = format_timedelta(self.duration)
+        self.script_id = serialise(self.script.title)
+        self.classes = " ".join(self.additional_classes)
 
     @classmethod
-    def from_fill_data(cls, data: FillData, *, index: int | None = None,
-                       additional_classes: list[str] | None = None) -> Self:
+    def from_fill_data(cls, data: FillData, *, index: int | None = None, additional_classes: list[str] | None = None,
+                       attendant_va: Collection[str] | None = None) -> Self:
         if additional_classes is None:
             additional_classes = []
 
@@ -102,14 +138,19 @@ class EFillData:
             index=index,
             script=data.script,
             private=data.private,
-            additional_classes=additional_classes
+            additional_classes=additional_classes,
+            attendant=bool(attendant_va and set(attendant_va) & set(data.creators))
         )
 
 
-@dataclass
+@dataclass(slots=True)
 class ESeriesData:
     title: str
     index: int
+    slug: str = field(init=False)
+
+    def __post_init__(self):
+        self.slug = serialise(self.title)
 
     @classmethod
     def from_series_data(cls, data: SeriesData) -> Self:
@@ -119,13 +160,13 @@ class ESeriesData:
         )
 
 
-@dataclass
+@dataclass(slots=True)
 class EScriptData:
     index: int
     title: str
     series: ESeriesData | None
-    audience_tags: list[str]
-    content_tags: list[str]
+    audience_tags: tuple[str, ...]
+    content_tags: tuple[str, ...]
     wordcount: int
     wordcount_tag: str
     summary: str
@@ -133,16 +174,26 @@ class EScriptData:
     published: date | None
     fills: list[EFillData]
     filled_by: list[str]
-    attendant_va: list[str] | None
+    attendant_va: tuple[str, ...] | None
     primary_link: str = field(init=False)
+    # the element id, which is also the script's id in the search and facet indexes
+    slug: str = field(init=False)
+    nsfw: bool = field(init=False)
+    classes: str = field(init=False)
+    tags_text: str = field(init=False)
+    audience_tag_classes: tuple[tuple[str, str], ...] = field(init=False)
+    content_tag_classes: tuple[tuple[str, str], ...] = field(init=False)
+    published_display: str = field(init=False)
 
     def __post_init__(self):
-        self.primary_link = ""
-        for link in self.links:
-            if "reddit.com" in link.href:
-                self.primary_link = link.href
-                break
-
+        self.primary_link = next((link.href for link in self.links if link.primary), "")
+        self.slug = serialise(self.title)
+        self.nsfw = any_nsfw(self.content_tags)
+        self.classes = script_classes(self.content_tags)
+        self.tags_text = join_content_tags(self.content_tags)
+        self.audience_tag_classes = tuple((tag, f"script-tag audience-tag {tag.lower()}") for tag in self.audience_tags)
+        self.content_tag_classes = tuple((tag, script_tag_classes(tag)) for tag in self.content_tags)
+        self.published_display = display_date(self.published) if self.published is not None else ""
 
 
 @dataclass
@@ -157,17 +208,41 @@ class ScriptContext:
 
     @classmethod
     def from_scripts(cls, scripts: list[Script]):
+        return cls.from_catalog(Catalog(scripts))
+
+    @classmethod
+    def from_catalog(cls, catalog: Catalog):
         return cls(
-            num_scripts=len(scripts),
-            num_fills=sum(s.num_fills for s in scripts),
-            series_options=get_series_options(scripts),
-            speaker_count_options=get_number_of_speakers(scripts),
-            audience_tags=get_audience_tags(scripts),
-            filled_by=get_filled_by(scripts),
-            scripts=make_script_data(scripts)
+            num_scripts=len(catalog),
+            num_fills=catalog.num_fills,
+            series_options=["", "(one-shots only)", *catalog.series_titles],
+            speaker_count_options=catalog.speaker_counts,
+            audience_tags=catalog.audience_tags,
+            filled_by=["", *catalog.vas],
+            scripts=make_script_data(catalog)
         )
 
 
+@dataclass
+class ViewModels:
+    """The view models of every page, built once per build from the catalog of scripts: each fill's view model is
+    shared between its script's entry on the index page and the all-fills page."""
+    catalog: Catalog
+    context: ScriptContext
+    fills: list[EFillData]
+
+    @classmethod
+    def from_scripts(cls, scripts: list[Script]) -> Self:
+        with instrumentation.stage("script_context"):
+            catalog = Catalog(scripts)
+            context = ScriptContext.from_catalog(catalog)
+
+        with instrumentation.stage("fill_data"):
+            fills = make_fill_data(context.scripts)
+
+        return cls(catalog=catalog, context=context, fills=fills)
+
+
 @dataclass
 class AudioContext:
     num_audios: int
@@ -181,44 +256,6 @@ class AudioContext:
         )
 
 
-def get_series_options(scripts: Iterable[Script]) -> list[str]:
-    """Get a list of all of the different series across the different scripts, including any and one-shot categories."""
-    series = set(script.series.title for script in scripts if script.series is not None)
-    return ["", "(one-shots only)", *sorted(series, key=str.lower)]
-
-
-def get_audience_tags(scripts: Iterable[Script]) -> list[str]:
-    """Get a sorted list of all audience tags across the different scripts."""
-    options: set[str] = set()
-
-    for script in scripts:
-        options |= set(tag.upper() for tag in script.audience)
-
-    return sorted(options)
-
-
-def get_number_of_speakers(scripts: Iterable[Script]) -> list[int]:
-    """Get a sorted list of all numbers of speakers across the different scripts."""
-    options: set[int] = set()
-
-    for script in scripts:
-        for audience in script.audience:
-            speakers = count_speakers(audience)
-            options.add(speakers)
-
-    return sorted(options)
-
-
-def get_filled_by(scripts: Iterable[Script]) -> list[str]:
-    """Get a sorted list of all VAs who have filled any of the scripts."""
-    options: set[str] = set()
-
-    for script in scripts:
-        options |= script.filled_by
-
-    return ["", *sorted(options, key=str.lower)]
-
-
 def make_wordcount_tag(words: WordCountData) -> str:
     """Return the inner HTML content corresponding to the given word count data"""
     num_speakers = len(words.spoken.keys())
@@ -234,11 +271,12 @@ def make_wordcount_tag(words: WordCountData) -> str:
     return f"{individuals} (={full:,} words)"
 
 
-def _make_script_data(i: int, script: Script) -> EScriptData:
+def _make_script_data(i: int, script: Script, filled_by: frozenset[str]) -> EScriptData:
     links = [ELinkData(href=href, label=label) for label, href in script.links.combine_dict().items() if href]
-    fills = [EFillData.from_fill_data(data=fill) for fill in script.fills]
-
-    filled_by: set[str] = set().union(*(set(fill.creators) for fill in fills))
+    blurred = any_nsfw(script.tags)
+    fills = [EFillData.from_fill_data(data=fill, additional_classes=["blurred"] if blurred else None,
+                                      attendant_va=script.attendant_va)
+             for fill in script.fills]
 
     series = ESeriesData.from_series_data(script.series) if script.series else None
     return EScriptData(
@@ -258,19 +296,15 @@ def _make_script_data(i: int, script: Script) -> EScriptData:
     )
 
 
-def make_script_data(scripts: list[Script]) -> list[EScriptData]:
-    return [_make_script_data(i, script) for i, script in reverse_enumerate(scripts)]
-
+def make_script_data(catalog: Catalog) -> list[EScriptData]:
+    return [_make_script_data(i, script, filled_by)
+            for (i, script), filled_by in zip(reverse_enumerate(catalog.scripts), catalog.filled_by)]
 
-def make_fill_data(scripts: list[Script]) -> list[EFillData]:
-    fills: list[EFillData] = []
-
-    for script in scripts:
-        for fill in script.fills:
-            additional_classes = ["blurred"] if any_nsfw(script.tags) else []
-            e = EFillData.from_fill_data(fill, additional_classes=additional_classes)
-            fills.append(e)
 
+def make_fill_data(scripts: list[EScriptData]) -> list[EFillData]:
+    """Return the fills of the given scripts' view models (the same objects, not copies), newest first and numbered
+    for the all-fills page."""
+    fills = [fill for script in scripts for fill in script.fills]
     fills.sort(key=lambda fill: fill.date, reverse=True)
 
     # fix the indexing
@@ -280,67 +314,352 @@ def make_fill_data(scripts: list[Script]) -> list[EFillData]:
     return fills
 
 
-def build_index(scripts: list[Script], template_dir: Path, output_file: Path) -> None:
-    """Write a new index.html"""
-    context = ScriptContext.from_scripts(scripts=scripts)
+def template_variables(model: Any) -> dict[str, Any]:
+    """Return the fields of the given view model as template variables. Unlike asdict, nothing is copied: the
+    templates read the view models themselves."""
+    return {f.name: getattr(model, f.name) for f in fields(model)}
 
-    env = jinja2.Environment(
-        loader=jinja2.FileSystemLoader(str(template_dir)),
-        autoescape=jinja2.select_autoescape(),
-    )
-    add_all_filters(env)
+
+def rendering_salt(template_dir: Path) -> str:
+    """Return a digest of everything other than the data that affects rendered output:
+    the templates in the given directory and the code that builds and filters the view models."""
+    meta = Path(__file__).parent
+    code = ("builder.py", "custom_filters.py", "build_icons.py", "links.py", "link_platforms.json")
+    sources = [*template_dir.glob("*.html"), *(meta / name for name in code)]
+    return digest_files(sources)
+
+
+# the number of fragments sent to a worker process at a time
+FRAGMENT_CHUNK_SIZE = 16
+
+
+def _render_fragment(template_dir: Path, precompiled: bool, template_name: str, context: dict[str, Any]) -> str:
+    """Render a single fragment. This runs in the worker processes when building in parallel."""
+    env = get_environment(template_dir, precompiled=precompiled)
+    template = env.get_template(template_name)
+
+    if not instrumentation.timing_templates():
+        return template.render(context)
+
+    start = time.perf_counter()
+    html = template.render(context)
+    instrumentation.record_render(template_name, time.perf_counter() - start)
+    return html
+
+
+def render_fragments(template_dir: Path, template_name: str, contexts: Iterable[dict[str, Any]], *,
+                     precompiled: bool = False, executor: Executor | None = None) -> Iterator[str]:
+    """Render the given template once for each context, in order, across the executor's workers if one is given.
+    Fragments are produced lazily, so that they can be streamed out as they are rendered."""
+    render = partial(_render_fragment, template_dir, precompiled, template_name)
+
+    if executor is None:
+        return map(render, contexts)
+
+    return executor.map(render, contexts, chunksize=FRAGMENT_CHUNK_SIZE)
+
+
+def iter_script_fragments(scripts: list[EScriptData], template_dir: Path, *, precompiled: bool = False,
+                          cache: FragmentCache | None = None, executor: Executor | None = None) -> Iterator[Markup]:
+    """Yield each script's rendered entry on the index page, reusing cached fragments for unchanged scripts when
+    possible."""
+    if cache is None:
+        contexts = ({"script": script} for script in scripts)
+        for html in render_fragments(template_dir, "script_data.html", contexts, precompiled=precompiled,
+                                     executor=executor):
+            yield Markup(html)
+        return
+
+    # the view model captures everything the fragment depends on (including its index)
+    keys = [cache.key(repr(script)) for script in scripts]
+
+    # render (and cache) whatever is missing up front, then stream everything back out of the cache
+    missing = [i for i, key in enumerate(keys) if key not in cache]
+    contexts = ({"script": scripts[i]} for i in missing)
+    rendered = render_fragments(template_dir, "script_data.html", contexts, precompiled=precompiled, executor=executor)
+
+    for i, html in zip(missing, rendered):
+        cache.put(keys[i], html)
+
+    for i, key in enumerate(keys):
+        html = cache.get(key)
+        if html is None:
+            # the fragment was removed after it was looked up (e.g., by another build pruning the cache)
+            html = _render_fragment(template_dir, precompiled, "script_data.html", {"script": scripts[i]})
+            cache.put(key, html)
+
+        yield Markup(html)
+
+
+# supplementary files for the index page (script chunks, search index) are written to this directory
+DATA_DIR_NAME = "index-data"
+
+
+@dataclass(slots=True)
+class BuildOptions:
+    # cache each script's rendered fragment, re-rendering only those that changed
+    incremental: bool = False
+    # render from templates precompiled to Python modules
+    precompiled: bool = False
+    # if set, only this many scripts are inlined in the index; the rest are written as chunks of this size
+    shard_size: int | None = None
+    # the number of processes to render fragments with
+    jobs: int = 1
+    # write compressed siblings of the generated files once they have been built
+    precompress: bool = False
+    # strip comments and collapse insignificant whitespace in the generated pages
+    minify: bool = False
+    # if set, also bring the SQLite export of the catalog at this path up to date
+    catalog_db: Path | None = None
+
+
+def clear_script_chunks(chunk_dir: Path, *, keep: Collection[Path] = ()) -> None:
+    """Remove the script chunks written by a previous build, other than those to keep."""
+    for stale in chunk_dir.glob("scripts-*.html"):
+        if stale not in keep:
+            remove_output(stale)
+
+
+def write_script_chunks(fragments: Iterator[Markup], chunk_dir: Path, size: int, *, minify: bool = False) -> list[str]:
+    """Write the given fragments to chunk files of (at most) the given number of scripts each, minifying them if
+    requested. Return the paths of the chunks, relative to the index page."""
+    written: list[Path] = []
+    n = 1
+    while chunk := list(islice(fragments, size)):
+        path = chunk_dir / f"scripts-{n:03}.html"
+        if minify:
+            write_stream(minify_stream(["\n".join(chunk)], name=f"{chunk_dir.name}/scripts-*.html"), path)
+        else:
+            write_text("\n".join(chunk), path)
+        written.append(path)
+        n += 1
+
+    # there may now be fewer chunks than last time
+    clear_script_chunks(chunk_dir, keep=set(written))
+
+    return [f"{chunk_dir.name}/{path.name}" for path in written]
+
+
+def render_index(context: ScriptContext, template_dir: Path, fragments: Iterable[Markup], *, chunks: list[str],
+                 search_index: str, facet_index: str, options: BuildOptions | None = None) -> Iterator[str]:
+    """Render index.html around the given script fragments, as a stream of text."""
+    if options is None:
+        options = BuildOptions()
+
+    env = get_environment(template_dir, precompiled=options.precompiled)
 
     template = env.get_template("index.html")
-    html = template.render(**asdict(context))
+    stream = template.generate(**template_variables(context), fragments=fragments, chunks=chunks,
+                               search_index=search_index, facet_index=facet_index)
+
+    return instrumentation.timed_stream(template.name, stream) if instrumentation.timing_templates() else stream
+
+
+def build_index(context: ScriptContext, template_dir: Path, output_file: Path, *,
+                options: BuildOptions | None = None, executor: Executor | None = None) -> None:
+    """Write a new index.html
+
+    In incremental mode, each script's rendered fragment is cached on disk, so only scripts whose data has changed
+    since the last build are re-rendered. In sharded mode, only the first scripts are inlined, and the page loads the
+    rest in chunks as they are needed.
 
-    with open(output_file, mode="w", encoding="utf-8") as f:
-        f.write(html)
+    The search index for the page's text filter and the facet index for its other filters are written alongside it.
+    """
+    if options is None:
+        options = BuildOptions()
 
+    # resolve the environment (precompiling the templates, if need be) before any fragment is rendered, so that the
+    # worker processes find the templates ready rather than all compiling them at once
+    get_environment(template_dir, precompiled=options.precompiled)
 
-def build_audios(audios: list[EFillData], template_dir: Path, output_file: Path) -> None:
+    cache: FragmentCache | None = None
+    if options.incremental:
+        cache = FragmentCache(CACHE_DIR / "fragments" / "index", salt=rendering_salt(template_dir))
+
+    fragments = iter_script_fragments(context.scripts, template_dir, precompiled=options.precompiled, cache=cache,
+                                      executor=executor)
+
+    data_dir = output_file.parent / DATA_DIR_NAME
+    data_dir.mkdir(parents=True, exist_ok=True)
+
+    with instrumentation.stage("indexes"):
+        search_index = data_dir / "search.json"
+        write_text(json.dumps(make_search_index(context.scripts), separators=(",", ":")), search_index)
+
+        facet_index = data_dir / "facets.json"
+        write_text(json.dumps(make_facet_index(context.scripts), separators=(",", ":")), facet_index)
+
+    chunks: list[str] = []
+    inline: Iterable[Markup] = fragments
+    if options.shard_size is not None:
+        with instrumentation.stage("script_chunks"):
+            inline = list(islice(fragments, options.shard_size))
+            chunks = write_script_chunks(fragments, data_dir, options.shard_size, minify=options.minify)
+    else:
+        clear_script_chunks(data_dir)
+
+    # the fragments are rendered as the page is written, so this covers both
+    with instrumentation.stage("index.html"):
+        stream = render_index(context, template_dir, inline, chunks=chunks, options=options,
+                              search_index=f"{DATA_DIR_NAME}/{search_index.name}",
+                              facet_index=f"{DATA_DIR_NAME}/{facet_index.name}")
+        if options.minify:
+            stream = minify_stream(stream, name=output_file.name)
+
+        write_stream(stream, output_file)
+
+    if cache is not None:
+        cache.prune()
+        instrumentation.record_cache("fragments", hits=cache.hits, misses=cache.misses)
+
+
+def build_audios(audios: list[EFillData], template_dir: Path, output_file: Path, *,
+                 options: BuildOptions | None = None) -> None:
     """Write a new audios.html"""
+    if options is None:
+        options = BuildOptions()
+
     context = AudioContext.from_audios(audios=audios)
 
-    env = jinja2.Environment(
-        loader=jinja2.FileSystemLoader(str(template_dir)),
-        autoescape=jinja2.select_autoescape(),
-    )
-    add_all_filters(env)
+    env = get_environment(template_dir, precompiled=options.precompiled)
 
     template = env.get_template("audios.html")
-    html = template.render(**asdict(context))
+    write_stream(template.generate(**template_variables(context)), output_file)
 
-    with open(output_file, mode="w", encoding="utf-8") as f:
-        f.write(html)
 
+def render_all_fills(fills: list[EFillData], template_dir: Path, *, options: BuildOptions | None = None,
+                     executor: Executor | None = None) -> Iterator[str]:
+    """Render all-fills.html, as a stream of text."""
+    if options is None:
+        options = BuildOptions()
 
-def build_all_fills(scripts: list[Script], template_dir: Path, output_file: Path) -> None:
-    """Write a new all-fills.html"""
-    fills = make_fill_data(scripts)
+    env = get_environment(template_dir, precompiled=options.precompiled)
 
-    env = jinja2.Environment(
-        loader=jinja2.FileSystemLoader(str(template_dir)),
-        autoescape=jinja2.select_autoescape(),
-    )
-    add_all_filters(env)
+    contexts = ({"fill": fill} for fill in fills)
+    rendered = render_fragments(template_dir, "fill.html", contexts, precompiled=options.precompiled, executor=executor)
 
     template = env.get_template("all-fills.html")
-    html = template.render(fills=fills)
+    stream = template.generate(fragments=map(Markup, rendered))
 
-    with open(output_file, mode="w", encoding="utf-8") as f:
-        f.write(html)
+    return instrumentation.timed_stream(template.name, stream) if instrumentation.timing_templates() else stream
 
 
-def main():
+def build_all_fills(fills: list[EFillData], template_dir: Path, output_file: Path, *,
+                    options: BuildOptions | None = None, executor: Executor | None = None) -> None:
+    """Write a new all-fills.html"""
+    if options is None:
+        options = BuildOptions()
+
+    with instrumentation.stage("all-fills.html"):
+        stream = render_all_fills(fills, template_dir, options=options, executor=executor)
+        if options.minify:
+            stream = minify_stream(stream, name=output_file.name)
+
+        write_stream(stream, output_file)
+
+
+# the build report is written here unless another path is given
+BUILD_REPORT = CACHE_DIR / "build-report.json"
+
+
+def add_build_arguments(parser: ArgumentParser) -> None:
+    """Add the options controlling how the pages are built to the given parser."""
+    parser.add_argument("--incremental", action="store_true",
+                        help="only re-render scripts which have changed since the last incremental build")
+    parser.add_argument("--precompile", action="store_true",
+                        help="render from templates precompiled to Python modules (compiling them if out of date)")
+    parser.add_argument("--shard-size", type=int, metavar="N",
+                        help="inline only the first N scripts in index.html, and load the rest in chunks of N")
+    parser.add_argument("-j", "--jobs", type=int, default=1, metavar="N",
+                        help="render with N processes, building index.html and all-fills.html at the same time")
+    parser.add_argument("--strict-dates", action="store_true", help="reject any date which is not in ISO format")
+    parser.add_argument("--precompress", action="store_true",
+                        help="write .gz (and .br, if brotli is installed) siblings of every changed page, data file, "
+                             "stylesheet and script")
+    parser.add_argument("--minify", action="store_true",
+                        help="strip comments and collapse insignificant whitespace in the generated pages")
+    parser.add_argument("--catalog-db", type=Path, nargs="?", const=CATALOG_DB, metavar="PATH",
+                        help="also export the catalog to a SQLite database (by default, in the build cache), "
+                             "updating only the scripts which have changed; see catalog_db.py to query it")
+    parser.add_argument("--report", type=Path, default=BUILD_REPORT, metavar="PATH",
+                        help="write the build report (timings, counts and cache hit rates) to this .json file")
+    parser.add_argument("--profile", action="store_true",
+                        help="also time each template, and write a cProfile dump next to the build report")
+
+
+def get_build_options(parser: ArgumentParser, args: Namespace) -> BuildOptions:
+    """Return the build options given by the parsed arguments, exiting with a usage error if any are invalid."""
+    if args.shard_size is not None and args.shard_size < 1:
+        parser.error("--shard-size must be positive")
+
+    if args.jobs < 1:
+        parser.error("--jobs must be positive")
+
+    return BuildOptions(incremental=args.incremental, precompiled=args.precompile, shard_size=args.shard_size,
+                        jobs=args.jobs, precompress=args.precompress, minify=args.minify, catalog_db=args.catalog_db)
+
+
+def site_directories(root: Path) -> list[Path]:
+    """Return the directories of the site (other than its sources) whose files are served."""
+    static = root / "static"
+    return [root, root / DATA_DIR_NAME, static, *sorted(path for path in static.rglob("*") if path.is_dir())]
+
+
+def build_pages(scripts: list[Script], audios: list[EFillData], *, options: BuildOptions) -> None:
+    """Write every page of the site, then precompress the site if requested (and otherwise, remove any compressed
+    siblings which are now out of date)."""
     root = Path(__file__).parent.parent
+
+    with recording_outputs():
+        _build_pages(scripts, audios, root=root, options=options)
+
+        if options.precompress:
+            # (compression runs on threads, so it uses every CPU whatever the number of rendering processes)
+            precompress(site_directories(root))
+        else:
+            remove_stale_siblings(site_directories(root))
+
+
+def _build_pages(scripts: list[Script], audios: list[EFillData], *, root: Path, options: BuildOptions) -> None:
     template_root = root / "meta" / "templates"
+    views = ViewModels.from_scripts(scripts)
+
+    if options.catalog_db is not None:
+        with instrumentation.stage("catalog_db"):
+            print(f"{options.catalog_db}: {export_catalog(views.catalog, options.catalog_db)}")
+
+    if options.jobs == 1:
+        build_index(views.context, template_dir=template_root / "index", output_file=root / "index.html",
+                    options=options)
+        # build_audios(audios, template_dir=template_root / "audios", output_file=root / "audios.html", options=options)
+        build_all_fills(views.fills, template_dir=template_root / "fills", output_file=root / "all-fills.html",
+                        options=options)
+        return
+
+    # both pages share one pool of worker processes; all-fills.html is assembled on a second thread while index.html
+    # is assembled on this one (spawned rather than forked workers, since this process is then multi-threaded)
+    with (ProcessPoolExecutor(options.jobs, mp_context=multiprocessing.get_context("spawn")) as executor,
+          ThreadPoolExecutor(1) as pages):
+        all_fills = pages.submit(build_all_fills, views.fills, template_dir=template_root / "fills",
+                                 output_file=root / "all-fills.html", options=options, executor=executor)
+        build_index(views.context, template_dir=template_root / "index", output_file=root / "index.html",
+                    options=options, executor=executor)
+        all_fills.result()
+
+
+def main():
+    parser = ArgumentParser()
+    add_build_arguments(parser)
+    args = parser.parse_args()
+
+    options = get_build_options(parser, args)
 
-    scripts = load_scripts()
-    audios = load_audios()
+    with instrumentation.session(args.report, profile=args.profile):
+        scripts, audios = load_scripts_and_audios(strict_dates=args.strict_dates)
+        build_pages(scripts, audios, options=options)
 
-    build_index(scripts, template_dir=template_root / "index", output_file=root / "index.html")
-    # build_audios(audios, template_dir=template_root / "audios", output_file=root / "audios.html")
-    build_all_fills(scripts, template_dir=template_root / "fills", output_file=root / "all-fills.html")
+    print(f"outputs: {instrumentation.outputs_summary()}")
+    print(f"build report written to {args.report}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import tempfile
+from collections.abc import Iterable
+from pathlib import Path
+
+# all build caches live under this (git-ignored) directory
+CACHE_DIR = Path(__file__).parent / ".cache"
+
+
+def digest_files(paths: Iterable[Path]) -> str:
+    """Return a single content hash covering all of the given files (and their names)."""
+    h = hashlib.sha256()
+
+    for path in sorted(paths):
+        h.update(path.name.encode("utf-8"))
+        h.update(b"\0")
+        h.update(path.read_bytes())
+        h.update(b"\0")
+
+    return h.hexdigest()
+
+
+def digest_text(*parts: str) -> str:
+    """Return the content hash of the given strings."""
+    h = hashlib.sha256()
+
+    for part in parts:
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+
+    return h.hexdigest()
+
+
+class FragmentCache:
+    """A disk cache of rendered HTML fragments, keyed on the content hash of whatever produced them.
+
+    Every key is salted with a digest of the template sources and the rendering code, so a change to either
+    invalidates the whole cache rather than serving stale fragments.
+    """
+
+    def __init__(self, directory: Path, salt: str) -> None:
+        self.directory = directory
+        self.salt = salt
+        self.hits = 0
+        self.misses = 0
+        self._used: set[str] = set()
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def key(self, content: str) -> str:
+        """Return the cache key for a fragment rendered from the given content."""
+        return digest_text(self.salt, content)
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.html"
+
+    def __contains__(self, key: str) -> bool:
+        """Return whether a fragment has been cached for this key, counting the lookup as a hit or a miss."""
+        self._used.add(key)
+
+        if self._path(key).exists():
+            self.hits += 1
+            return True
+
+        self.misses += 1
+        return False
+
+    def get(self, key: str) -> str | None:
+        """Return the cached fragment for this key, or None if it has not been rendered before."""
+        self._used.add(key)
+
+        try:
+            return self._path(key).read_bytes().decode("utf-8")
+        except FileNotFoundError:
+            return None
+
+    def put(self, key: str, html: str) -> None:
+        """Store a rendered fragment.
+
+        The fragment is written to a temporary file which then replaces the cached one, so an interrupted build (or
+        another process storing the same fragment) never leaves a partial fragment to be served as a hit.
+        """
+        self._used.add(key)
+
+        fd, temp = tempfile.mkstemp(dir=self.directory, prefix=f".{key}.", suffix=".tmp")
+        try:
+            with open(fd, "wb") as f:
+                f.write(html.encode("utf-8"))
+            os.replace(temp, self._path(key))
+        except BaseException:
+            Path(temp).unlink(missing_ok=True)
+            raise
+
+    def prune(self) -> int:
+        """Remove every cached fragment not used since this cache was opened. Return the number removed."""
+        removed = 0
+
+        for path in self.directory.glob("*.html"):
+            if path.stem not in self._used:
+                path.unlink()
+                removed += 1
+
+        return removed
@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+from collections import defaultdict
+from collections.abc import Iterable, Iterator
+from datetime import datetime
+from functools import cached_property
+from operator import attrgetter
+
+from parser import Script, ScriptFingerprint, count_speakers
+
+
+def published_scripts(scripts: Iterable[Script]) -> list[Script]:
+    """Return only the published scripts, newest first."""
+    published = [s for s in scripts if s.published is not None and s.published <= datetime.today()]
+    return sorted(published, key=attrgetter("published"), reverse=True)
+
+
+class Catalog:
+    """The scripts (in the order given, e.g. newest first), indexed in a single pass over them.
+
+    Each index maps a key to the positions of the scripts with it, in order: by the VAs who have filled them, by
+    content tag, by audience tag (upper-cased, as the index page's filter shows them), by number of speakers and by
+    series title. Scripts can also be looked up by fingerprint. The aggregates over the whole catalog (the filter
+    options and counts) are computed from the indexes the first time they are needed, then cached.
+    """
+
+    def __init__(self, scripts: Iterable[Script]) -> None:
+        self.scripts = list(scripts)
+
+        self.by_va: dict[str, list[int]] = defaultdict(list)
+        self.by_tag: dict[str, list[int]] = defaultdict(list)
+        self.by_audience: dict[str, list[int]] = defaultdict(list)
+        self.by_speakers: dict[int, list[int]] = defaultdict(list)
+        self.by_series: dict[str, list[int]] = defaultdict(list)
+        self.by_fingerprint: dict[ScriptFingerprint, int] = {}
+        # the VAs who have filled each script
+        self.filled_by: list[frozenset[str]] = []
+        self.num_fills = 0
+
+        for i, script in enumerate(self.scripts):
+            vas = frozenset(creator for fill in script.fills for creator in fill.creators)
+            self.filled_by.append(vas)
+            self.num_fills += len(script.fills)
+
+            for va in vas:
+                self.by_va[va].append(i)
+
+            for tag in script.tags:
+                self.by_tag[tag].append(i)
+
+            # a script may list several audiences with the same tag or number of speakers, but is indexed once
+            for tag in dict.fromkeys(tag.upper() for tag in script.audience):
+                self.by_audience[tag].append(i)
+
+            for speakers in dict.fromkeys(map(count_speakers, script.audience)):
+                self.by_speakers[speakers].append(i)
+
+            if script.series is not None:
+                self.by_series[script.series.title].append(i)
+
+            self.by_fingerprint.setdefault(script.fingerprint, i)
+
+        # lookups of missing keys should not add them
+        for index in (self.by_va, self.by_tag, self.by_audience, self.by_speakers, self.by_series):
+            index.default_factory = None
+
+    def __len__(self) -> int:
+        return len(self.scripts)
+
+    def __iter__(self) -> Iterator[Script]:
+        return iter(self.scripts)
+
+    def find(self, fingerprint: ScriptFingerprint) -> Script | None:
+        """Return the script with the given fingerprint (e.g., the script a fill refers to), if it is in the catalog."""
+        i = self.by_fingerprint.get(fingerprint)
+        return None if i is None else self.scripts[i]
+
+    def filled_by_va(self, va: str) -> list[Script]:
+        """Return the scripts which the given VA has filled."""
+        return [self.scripts[i] for i in self.by_va.get(va, [])]
+
+    @cached_property
+    def series_titles(self) -> list[str]:
+        """The title of every series, sorted case-insensitively."""
+        return sorted(self.by_series, key=str.lower)
+
+    @cached_property
+    def audience_tags(self) -> list[str]:
+        """Every audience tag (upper-cased), sorted."""
+        return sorted(self.by_audience)
+
+    @cached_property
+    def speaker_counts(self) -> list[int]:
+        """Every number of speakers any script is for, sorted."""
+        return sorted(self.by_speakers)
+
+    @cached_property
+    def vas(self) -> list[str]:
+        """Every VA who has filled any script, sorted case-insensitively."""
+        return sorted(self.by_va, key=str.lower)
@@ -0,0 +1,589 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+import sys
+import time
+from argparse import ArgumentParser
+from collections.abc import Iterator, Sequence
+from contextlib import closing, contextmanager
+from dataclasses import asdict, dataclass, field
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Any
+
+import instrumentation
+from cache import CACHE_DIR, digest_files, digest_text
+from catalog import Catalog, published_scripts
+from custom_filters import any_nsfw, join_content_tags, serialise
+from parser import FillData, Script, count_speakers, load
+
+ROOT = Path(__file__).parent.parent
+DATA_FILE = ROOT / "script-data.json"
+
+# the SQLite export of the catalog, which each export updates in place
+CATALOG_DB = CACHE_DIR / "catalog.sqlite3"
+
+# the series filter's option for scripts which are not part of any series (as on the index page)
+ONE_SHOTS_ONLY = "(one-shots only)"
+
+# the options of the filled status and SFW/NSFW filters (as on the index page)
+FILLED_STATUSES = frozenset({"filled", "unfilled"})
+NSFW_STATUSES = frozenset({"SFW", "NSFW"})
+
+# how the dates are stored
+DATE_FORMAT = "%Y-%m-%d"
+
+SCHEMA = """
+CREATE TABLE metadata (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+
+CREATE TABLE series (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE scripts (
+    id INTEGER PRIMARY KEY,
+    -- identifies the script from one export to the next (see script_keys)
+    key TEXT NOT NULL UNIQUE,
+    -- the content hash of the script, which changes whenever anything about it does
+    digest TEXT NOT NULL,
+    -- the script's position on the index page (newest first)
+    position INTEGER NOT NULL,
+    slug TEXT NOT NULL,
+    title TEXT NOT NULL,
+    authors TEXT NOT NULL,
+    -- the audience tags and content tags, as the index page gives them (e.g., "F4M,F4A" and "[tag1][tag2]")
+    audience TEXT NOT NULL,
+    tags TEXT NOT NULL,
+    wordcount INTEGER NOT NULL,
+    total_words INTEGER NOT NULL,
+    published TEXT,
+    finished TEXT,
+    series_id INTEGER REFERENCES series (id),
+    series_index INTEGER,
+    link TEXT,
+    nsfw INTEGER NOT NULL,
+    num_fills INTEGER NOT NULL
+);
+
+CREATE INDEX scripts_position ON scripts (position);
+CREATE INDEX scripts_wordcount ON scripts (wordcount);
+CREATE INDEX scripts_series ON scripts (series_id);
+CREATE INDEX scripts_num_fills ON scripts (num_fills);
+CREATE INDEX scripts_nsfw ON scripts (nsfw);
+
+-- kept apart from the rest of each script, so that the rows the filters read stay small
+CREATE TABLE summaries (
+    script_id INTEGER PRIMARY KEY REFERENCES scripts (id) ON DELETE CASCADE,
+    summary TEXT NOT NULL
+);
+
+CREATE TABLE tags (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE script_tags (
+    tag_id INTEGER NOT NULL REFERENCES tags (id),
+    script_id INTEGER NOT NULL REFERENCES scripts (id) ON DELETE CASCADE,
+    PRIMARY KEY (tag_id, script_id)
+) WITHOUT ROWID;
+
+CREATE INDEX script_tags_script ON script_tags (script_id);
+
+-- audience tags are upper-cased, as the index page's filter shows them
+CREATE TABLE audiences (
+    id INTEGER PRIMARY KEY,
+    tag TEXT NOT NULL UNIQUE,
+    speakers INTEGER NOT NULL
+);
+
+CREATE INDEX audiences_speakers ON audiences (speakers);
+
+CREATE TABLE script_audiences (
+    audience_id INTEGER NOT NULL REFERENCES audiences (id),
+    script_id INTEGER NOT NULL REFERENCES scripts (id) ON DELETE CASCADE,
+    PRIMARY KEY (audience_id, script_id)
+) WITHOUT ROWID;
+
+CREATE INDEX script_audiences_script ON script_audiences (script_id);
+
+CREATE TABLE vas (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE fills (
+    id INTEGER PRIMARY KEY,
+    script_id INTEGER NOT NULL REFERENCES scripts (id) ON DELETE CASCADE,
+    title TEXT NOT NULL,
+    audience TEXT NOT NULL,
+    date TEXT,
+    -- in seconds
+    duration REAL,
+    label TEXT,
+    private INTEGER NOT NULL,
+    -- a JSON object of the fill's links, by label
+    links TEXT
+);
+
+CREATE INDEX fills_script ON fills (script_id);
+
+CREATE TABLE fill_creators (
+    va_id INTEGER NOT NULL REFERENCES vas (id),
+    fill_id INTEGER NOT NULL REFERENCES fills (id) ON DELETE CASCADE,
+    PRIMARY KEY (va_id, fill_id)
+) WITHOUT ROWID;
+
+CREATE INDEX fill_creators_fill ON fill_creators (fill_id);
+
+-- the text the filter box matches against (lowercased, one row per script, with the script's id as its rowid): the
+-- trigram tokenizer lets any substring of at least three characters be looked up in the index
+CREATE VIRTUAL TABLE scripts_fts USING fts5 (title, summary, tags, tokenize = 'trigram case_sensitive 1');
+"""
+
+
+def schema_salt() -> str:
+    """Return a digest of everything other than the data that affects what is exported: the schema, and the code
+    deriving the slugs, NSFW flags and speaker counts. A database exported with a different salt is rebuilt."""
+    here = Path(__file__).parent
+    return digest_files([here / "catalog_db.py", here / "custom_filters.py", here / "parser.py"])
+
+
+def connect(path: Path = CATALOG_DB) -> sqlite3.Connection:
+    """Open the database at the given path, creating it (or recreating it, if it was exported with a different
+    schema or code) as necessary."""
+    salt = schema_salt()
+
+    if path.exists():
+        conn = sqlite3.connect(path)
+        try:
+            stored = conn.execute("SELECT value FROM metadata WHERE key = 'salt'").fetchone()
+        except sqlite3.DatabaseError:
+            stored = None
+        finally:
+            conn.close()
+
+        if stored is not None and stored[0] == salt:
+            return _open(path)
+
+        path.unlink()
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = _open(path)
+    with conn:
+        conn.executescript(SCHEMA)
+        conn.execute("INSERT INTO metadata (key, value) VALUES ('salt', ?)", (salt,))
+
+    return conn
+
+
+def _open(path: Path) -> sqlite3.Connection:
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    return conn
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# export
+# ----------------------------------------------------------------------------------------------------------------------
+@dataclass(slots=True)
+class ExportSummary:
+    added: int = 0
+    changed: int = 0
+    unchanged: int = 0
+    removed: int = 0
+
+    def __str__(self) -> str:
+        return f"{self.added} added, {self.changed} changed, {self.unchanged} unchanged, {self.removed} removed"
+
+
+def script_keys(scripts: Sequence[Script]) -> list[str]:
+    """Return the key identifying each script from one export to the next: a digest of its fingerprint (so a script
+    keeps its key however else it changes), and of how many scripts before it have the same fingerprint."""
+    seen: dict[str, int] = {}
+    keys: list[str] = []
+
+    for script in scripts:
+        fingerprint = repr(script.fingerprint)
+        occurrence = seen[fingerprint] = seen.get(fingerprint, -1) + 1
+        keys.append(digest_text(fingerprint, str(occurrence)))
+
+    return keys
+
+
+def _format_date(d: date | None) -> str | None:
+    return d.strftime(DATE_FORMAT) if d is not None else None
+
+
+class _Ids:
+    """The ids of the rows of a lookup table (e.g., the tags), inserting the rows which are missing as needed."""
+
+    def __init__(self, conn: sqlite3.Connection, table: str, column: str) -> None:
+        self.conn = conn
+        self.table = table
+        self.column = column
+        self.ids: dict[Any, int] = dict(conn.execute(f"SELECT {column}, id FROM {table}"))
+
+    def get(self, value: Any, **extra: Any) -> int:
+        if (row_id := self.ids.get(value)) is None:
+            columns = ", ".join([self.column, *extra])
+            placeholders = ", ".join("?" * (1 + len(extra)))
+            cursor = self.conn.execute(f"INSERT INTO {self.table} ({columns}) VALUES ({placeholders})",
+                                       (value, *extra.values()))
+            row_id = self.ids[value] = cursor.lastrowid
+
+        return row_id
+
+
+@dataclass
+class _Exporter:
+    conn: sqlite3.Connection
+    series: _Ids = field(init=False)
+    tags: _Ids = field(init=False)
+    audiences: _Ids = field(init=False)
+    vas: _Ids = field(init=False)
+
+    def __post_init__(self):
+        self.series = _Ids(self.conn, "series", "title")
+        self.tags = _Ids(self.conn, "tags", "name")
+        self.audiences = _Ids(self.conn, "audiences", "tag")
+        self.vas = _Ids(self.conn, "vas", "name")
+
+    def insert_script(self, script: Script, *, key: str, digest: str, position: int) -> None:
+        conn = self.conn
+        series_id = self.series.get(script.series.title) if script.series is not None else None
+
+        script_id = conn.execute(
+            "INSERT INTO scripts (key, digest, position, slug, title, authors, audience, tags, wordcount, total_words, "
+            "published, finished, series_id, series_index, link, nsfw, num_fills) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (key, digest, position, serialise(script.title), script.title, ", ".join(script.authors),
+             ",".join(script.audience), join_content_tags(script.tags), script.words.all_spoken, script.words.total,
+             _format_date(script.published), _format_date(script.finished), series_id,
+             script.series.index if script.series is not None else None, script.links.canonical_link,
+             any_nsfw(script.tags), len(script.fills))
+        ).lastrowid
+        conn.execute("INSERT INTO summaries (script_id, summary) VALUES (?, ?)", (script_id, script.summary))
+
+        conn.executemany("INSERT OR IGNORE INTO script_tags (tag_id, script_id) VALUES (?, ?)",
+                         [(self.tags.get(tag), script_id) for tag in script.tags])
+        # a script may list several audiences with the same (upper-cased) tag, but is associated with it once
+        conn.executemany("INSERT OR IGNORE INTO script_audiences (audience_id, script_id) VALUES (?, ?)",
+                         [(self.audiences.get(tag, speakers=count_speakers(tag)), script_id)
+                          for tag in dict.fromkeys(tag.upper() for tag in script.audience)])
+
+        for fill in script.fills:
+            self.insert_fill(fill, script_id)
+
+        # the searchable text is lowercased exactly as search_index.searchable_text does it
+        conn.execute("INSERT INTO scripts_fts (rowid, title, summary, tags) VALUES (?, ?, ?, ?)",
+                     (script_id, script.title.lower(), script.summary.lower(), "\n".join(script.tags).lower()))
+
+    def insert_fill(self, fill: FillData, script_id: int) -> None:
+        duration = fill.duration.total_seconds() if isinstance(fill.duration, timedelta) else None
+        links = json.dumps(fill.links) if fill.links is not None else None
+
+        fill_id = self.conn.execute(
+            "INSERT INTO fills (script_id, title, audience, date, duration, label, private, links) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (script_id, fill.title, fill.audience, _format_date(fill.date), duration, fill.label, fill.private, links)
+        ).lastrowid
+
+        self.conn.executemany("INSERT OR IGNORE INTO fill_creators (va_id, fill_id) VALUES (?, ?)",
+                              [(self.vas.get(va), fill_id) for va in fill.creators])
+
+    def delete_scripts(self, script_ids: list[int]) -> None:
+        # (their summaries, tags, audiences and fills are deleted with them)
+        params = [(script_id,) for script_id in script_ids]
+        self.conn.executemany("DELETE FROM scripts_fts WHERE rowid = ?", params)
+        self.conn.executemany("DELETE FROM scripts WHERE id = ?", params)
+
+    def prune(self) -> None:
+        """Delete the series, tags, audiences and VAs which no script (or fill) refers to any longer."""
+        # (executescript would commit the export's transaction first)
+        self.conn.execute("DELETE FROM series WHERE id NOT IN "
+                          "(SELECT series_id FROM scripts WHERE series_id IS NOT NULL)")
+        self.conn.execute("DELETE FROM tags WHERE id NOT IN (SELECT tag_id FROM script_tags)")
+        self.conn.execute("DELETE FROM audiences WHERE id NOT IN (SELECT audience_id FROM script_audiences)")
+        self.conn.execute("DELETE FROM vas WHERE id NOT IN (SELECT va_id FROM fill_creators)")
+
+
+def export_catalog(catalog: Catalog, path: Path = CATALOG_DB) -> ExportSummary:
+    """Bring the database at the given path up to date with the catalog, in a single transaction.
+
+    Only the scripts which have been added, changed or removed since the last export are written; the others at most
+    have their positions updated. A changed script is replaced outright, fills and all.
+    """
+    summary = ExportSummary()
+    scripts = catalog.scripts
+
+    with closing(connect(path)) as conn:
+        existing = {key: (script_id, digest, position) for key, script_id, digest, position
+                    in conn.execute("SELECT key, id, digest, position FROM scripts")}
+
+        with conn:
+            exporter = _Exporter(conn)
+            added: list[tuple[int, Script, str, str]] = []
+            replaced: list[int] = []
+            moved: list[tuple[int, int]] = []
+
+            for position, (script, key) in enumerate(zip(scripts, script_keys(scripts))):
+                digest = digest_text(repr(script))
+                old = existing.pop(key, None)
+
+                if old is None:
+                    summary.added += 1
+                elif old[1] != digest:
+                    summary.changed += 1
+                    replaced.append(old[0])
+                else:
+                    summary.unchanged += 1
+                    if old[2] != position:
+                        moved.append((position, old[0]))
+                    continue
+
+                added.append((position, script, key, digest))
+
+            removed = [script_id for script_id, _, _ in existing.values()]
+            summary.removed = len(removed)
+
+            exporter.delete_scripts(replaced + removed)
+            conn.executemany("UPDATE scripts SET position = ? WHERE id = ?", moved)
+
+            for position, script, key, digest in added:
+                exporter.insert_script(script, key=key, digest=digest, position=position)
+
+            if replaced or removed:
+                exporter.prune()
+
+        if summary.changed or summary.removed:
+            # keep the full-text index compact as rows are replaced
+            with conn:
+                conn.execute("INSERT INTO scripts_fts (scripts_fts) VALUES ('optimize')")
+
+        # (and the query planner's statistics up to date)
+        conn.execute("PRAGMA optimize")
+
+    for status in ("added", "changed", "unchanged", "removed"):
+        instrumentation.count(f"catalog_db_{status}", getattr(summary, status))
+
+    return summary
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# queries
+# ----------------------------------------------------------------------------------------------------------------------
+@dataclass(slots=True, frozen=True)
+class ScriptFilters:
+    """The filters of the index page (see readFilters in static/js/script.js), with the same semantics as its
+    filterScripts: a script is selected only if it passes every one of them.
+
+    The default of each filter selects every script, as does the page before any filter is changed. An empty set of
+    options (e.g., no audience tags checked) selects none.
+    """
+    # matched (lowercased) against the title, summary and each tag
+    text: str = ""
+    # the range of spoken words, inclusive
+    min_words: int | None = None
+    max_words: int | None = None
+    # a series title, ONE_SHOTS_ONLY, or "" for any
+    series: str = ""
+    # any one of the (upper-cased) audience tags, or None for any
+    audience: frozenset[str] | None = None
+    # any one of the numbers of speakers, or None for any
+    speakers: frozenset[int] | None = None
+    # a VA who has filled the script, or "" for any
+    filled_by: str = ""
+    # any of "filled" and "unfilled"
+    filled_status: frozenset[str] = FILLED_STATUSES
+    # any of "SFW" and "NSFW"
+    nsfw_status: frozenset[str] = NSFW_STATUSES
+
+
+@dataclass(slots=True, frozen=True)
+class ScriptMatch:
+    position: int
+    slug: str
+    title: str
+    audience: str
+    tags: str
+    wordcount: int
+    num_fills: int
+    series: str | None
+    series_index: int | None
+    published: str | None
+    link: str | None
+
+
+def _text_condition(text: str) -> tuple[str, list[Any]]:
+    # the trigram index can only look up text of at least three characters: anything shorter is checked against each
+    # script which passes the other filters (so this condition must come last)
+    if len(text) >= 3:
+        phrase = '"' + text.replace('"', '""') + '"'
+        return "s.id IN (SELECT rowid FROM scripts_fts WHERE scripts_fts MATCH ?)", [phrase]
+
+    return ("EXISTS (SELECT 1 FROM scripts_fts WHERE rowid = s.id "
+            "AND (instr(title, ?) OR instr(tags, ?) OR instr(summary, ?)))", [text] * 3)
+
+
+def _in_list(values: Sequence[Any]) -> str:
+    return f"({', '.join('?' * len(values))})"
+
+
+def _where(filters: ScriptFilters) -> tuple[str, list[Any]]:
+    """Return the conditions (and their parameters) selecting the scripts which pass the filters."""
+    conditions: list[str] = []
+    params: list[Any] = []
+
+    def where(condition: str, *values: Any) -> None:
+        conditions.append(condition)
+        params.extend(values)
+
+    if filters.min_words is not None:
+        where("s.wordcount >= ?", filters.min_words)
+
+    if filters.max_words is not None:
+        where("s.wordcount <= ?", filters.max_words)
+
+    filled = FILLED_STATUSES & filters.filled_status
+    if filled != FILLED_STATUSES:
+        where("s.num_fills > 0" if filled == {"filled"} else "s.num_fills = 0" if filled == {"unfilled"} else "0")
+
+    if filters.series == ONE_SHOTS_ONLY:
+        where("s.series_id IS NULL")
+    elif filters.series:
+        where("s.series_id = (SELECT id FROM series WHERE title = ?)", filters.series)
+
+    if filters.speakers is not None:
+        counts = sorted(filters.speakers)
+        where("s.id IN (SELECT sa.script_id FROM script_audiences sa JOIN audiences a ON a.id = sa.audience_id "
+              f"WHERE a.speakers IN {_in_list(counts)})", *counts)
+
+    if filters.audience is not None:
+        tags = sorted(filters.audience)
+        where("s.id IN (SELECT sa.script_id FROM script_audiences sa JOIN audiences a ON a.id = sa.audience_id "
+              f"WHERE a.tag IN {_in_list(tags)})", *tags)
+
+    if filters.filled_by:
+        where("s.id IN (SELECT f.script_id FROM fill_creators fc JOIN fills f ON f.id = fc.fill_id "
+              "WHERE fc.va_id = (SELECT id FROM vas WHERE name = ?))", filters.filled_by)
+
+    nsfw = NSFW_STATUSES & filters.nsfw_status
+    if nsfw != NSFW_STATUSES:
+        where("s.nsfw = 1" if nsfw == {"NSFW"} else "s.nsfw = 0" if nsfw == {"SFW"} else "0")
+
+    if text := filters.text.strip().lower():
+        condition, values = _text_condition(text)
+        where(condition, *values)
+
+    return " AND ".join(conditions) or "1", params
+
+
+def query_scripts(conn: sqlite3.Connection, filters: ScriptFilters, *, limit: int | None = None) -> list[ScriptMatch]:
+    """Return the scripts which pass the filters, in the order of the index page (newest first)."""
+    where, params = _where(filters)
+    rows = conn.execute(
+        "SELECT s.position, s.slug, s.title, s.audience, s.tags, s.wordcount, s.num_fills, series.title, "
+        "s.series_index, s.published, s.link FROM scripts s LEFT JOIN series ON series.id = s.series_id "
+        f"WHERE {where} ORDER BY s.position LIMIT ?",
+        [*params, -1 if limit is None else limit]
+    )
+    return [ScriptMatch(*row) for row in rows]
+
+
+def count_scripts(conn: sqlite3.Connection, filters: ScriptFilters) -> tuple[int, int]:
+    """Return the number of scripts which pass the filters, and their number of fills (as the index page shows)."""
+    where, params = _where(filters)
+    scripts, fills = conn.execute(f"SELECT count(*), total(s.num_fills) FROM scripts s WHERE {where}",
+                                  params).fetchone()
+    return scripts, int(fills)
+
+
+@contextmanager
+def open_catalog(path: Path = CATALOG_DB) -> Iterator[sqlite3.Connection]:
+    """Open an exported database to query it."""
+    if not path.exists():
+        raise FileNotFoundError(f"no catalog database at {path} (export one first)")
+
+    with closing(sqlite3.connect(f"{path.as_uri()}?mode=ro", uri=True)) as conn:
+        yield conn
+
+
+def main():
+    parser = ArgumentParser(description="Export the catalog to a SQLite database, or query an exported database "
+                                        "with the index page's filters.")
+    parser.add_argument("--db", type=Path, default=CATALOG_DB, help="the database file")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export = commands.add_parser("export", help="bring the database up to date with the published scripts")
+    export.add_argument("-d", "--data-file", type=Path, default=DATA_FILE, help="the .json data file to export")
+
+    query = commands.add_parser("query", help="list the scripts which pass the given filters, newest first")
+    query.add_argument("-t", "--text", default="", help="text to find in the title, summary or tags")
+    query.add_argument("--min-words", type=int, metavar="N", help="at least this many spoken words")
+    query.add_argument("--max-words", type=int, metavar="N", help="at most this many spoken words")
+    query.add_argument("--series", default="", help=f"the series title, or {ONE_SHOTS_ONLY!r}")
+    query.add_argument("--audience", action="append", metavar="TAG",
+                       help="any of these audience tags (e.g., F4M; may be repeated)")
+    query.add_argument("--speakers", action="append", type=int, metavar="N",
+                       help="for any of these numbers of speakers (may be repeated)")
+    query.add_argument("--filled-by", default="", metavar="VA", help="filled by this VA")
+    filled = query.add_mutually_exclusive_group()
+    filled.add_argument("--filled", action="store_true", help="only scripts which have been filled")
+    filled.add_argument("--unfilled", action="store_true", help="only scripts which have not been filled")
+    nsfw = query.add_mutually_exclusive_group()
+    nsfw.add_argument("--sfw", action="store_true", help="only SFW scripts")
+    nsfw.add_argument("--nsfw", action="store_true", help="only NSFW scripts")
+    query.add_argument("-n", "--limit", type=int, metavar="N", help="list at most N scripts")
+    query.add_argument("--json", action="store_true", help="list the scripts as JSON lines")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        with instrumentation.stage("catalog_db"):
+            summary = export_catalog(Catalog(published_scripts(load(args.data_file).scripts)), args.db)
+
+        print(f"{args.db}: {summary}")
+        return
+
+    filters = ScriptFilters(
+        text=args.text,
+        min_words=args.min_words,
+        max_words=args.max_words,
+        series=args.series,
+        audience=frozenset(tag.upper() for tag in args.audience) if args.audience is not None else None,
+        speakers=frozenset(args.speakers) if args.speakers is not None else None,
+        filled_by=args.filled_by,
+        filled_status=frozenset({"filled"}) if args.filled else frozenset({"unfilled"}) if args.unfilled
+        else FILLED_STATUSES,
+        nsfw_status=frozenset({"SFW"}) if args.sfw else frozenset({"NSFW"}) if args.nsfw else NSFW_STATUSES,
+    )
+
+    with open_catalog(args.db) as conn:
+        start = time.perf_counter()
+        matches = query_scripts(conn, filters, limit=args.limit)
+        if args.limit is None:
+            num_scripts, num_fills = len(matches), sum(match.num_fills for match in matches)
+        else:
+            num_scripts, num_fills = count_scripts(conn, filters)
+        elapsed = time.perf_counter() - start
+
+    for match in matches:
+        if args.json:
+            print(json.dumps(asdict(match)))
+        else:
+            series = f" [{match.series} #{match.series_index}]" if match.series is not None else ""
+            print(f"{match.published}: {match.title}{series} ({match.audience}; {match.wordcount:,} words; "
+                  f"{match.num_fills} fills) {match.link or ''}")
+
+    print(f"{num_scripts} scripts, {num_fills} fills ({elapsed * 1000:.1f}ms)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
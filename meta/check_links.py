@@ -0,0 +1,477 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import ssl
+import sys
+import time
+from argparse import ArgumentParser
+from collections.abc import Collection, Iterable
+from dataclasses import asdict, dataclass, replace
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from urllib.parse import quote, urljoin, urlsplit
+
+from cache import CACHE_DIR
+from outputs import recording_outputs, write_text
+from parser import FillData, Script, load
+
+ROOT = Path(__file__).parent.parent
+DATA_FILE = ROOT / "script-data.json"
+
+# the result of every link's last check, so that links checked recently are not requested again
+RESULTS_CACHE = CACHE_DIR / "links.json"
+
+USER_AGENT = "lilellia-masterlist-link-checker/1.0"
+MAX_REDIRECTS = 5
+REDIRECT_STATUSES = {301, 302, 303, 307, 308}
+
+# statuses with which some servers refuse HEAD requests for resources which do exist, so the link is retried with GET
+HEAD_REFUSED_STATUSES = {403, 405, 501}
+
+# the statuses with which a host asks for requests to be slowed down: every 429, and any 503 with a Retry-After (a
+# link's status is inconclusive while its host keeps answering with them)
+THROTTLED_STATUSES = {429, 503}
+
+# how many times a throttled request is retried, and how long the host is left alone before each retry (as asked
+# for by its Retry-After, within these bounds), in seconds
+MAX_THROTTLED_RETRIES = 3
+DEFAULT_RETRY_AFTER = 5.0
+MAX_RETRY_AFTER = 60.0
+
+# the characters left as they are when a URL's path or query is percent-encoded for the request line
+URL_SAFE = "/%:@!$&'()*+,;=~-._?"
+
+
+@dataclass(slots=True)
+class LinkResult:
+    url: str
+    # the final HTTP status (after redirects), or None if there was no response
+    status: int | None
+    # when the link was last checked, in seconds since the epoch
+    checked: float
+    etag: str | None = None
+    last_modified: str | None = None
+    # where the link redirects to, if anywhere
+    final_url: str | None = None
+    error: str | None = None
+    # whether the host was still asking for requests to be slowed down after every retry, so that the link's status
+    # is unknown (such results are never cached)
+    throttled: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return self.status is not None and self.status < 400
+
+    @property
+    def broken(self) -> bool:
+        return not self.ok and not self.throttled
+
+    def describe(self) -> str:
+        if self.status is None:
+            return f"no response ({self.error})"
+
+        return f"HTTP {self.status} (throttled)" if self.throttled else f"HTTP {self.status}"
+
+
+class ResultCache:
+    """The on-disk cache of link check results.
+
+    A working link's result is reused without any request until it is older than the TTL; after that, the link is
+    revalidated with a conditional request (If-None-Match / If-Modified-Since), which the server can answer with a
+    bodiless 304 if nothing has changed. Broken links are always checked again, and throttled checks are not stored
+    at all. Results older than the TTL are evicted once their link is no longer in the catalog.
+    """
+
+    def __init__(self, path: Path, ttl: float) -> None:
+        self.path = path
+        self.ttl = ttl
+        self.hits = 0
+
+        try:
+            entries = json.loads(path.read_bytes())
+        except (FileNotFoundError, ValueError):
+            entries = {}
+
+        self._results = {url: LinkResult(**entry) for url, entry in entries.items()}
+
+    def get(self, url: str) -> LinkResult | None:
+        return self._results.get(url)
+
+    def fresh(self, url: str, now: float) -> LinkResult | None:
+        """Return the link's cached result if it can be used as it is."""
+        result = self._results.get(url)
+        if result is None or not result.ok or now - result.checked >= self.ttl:
+            return None
+
+        self.hits += 1
+        return result
+
+    def put(self, result: LinkResult) -> None:
+        self._results[result.url] = result
+
+    def save(self, current: Collection[str], now: float) -> None:
+        """Write the cache out, evicting the expired results of links which are not among the current ones."""
+        self._results = {url: result for url, result in self._results.items()
+                         if url in current or now - result.checked < self.ttl}
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        entries = {url: asdict(result) for url, result in sorted(self._results.items())}
+        write_text(json.dumps(entries, indent=4), self.path, tracked=False)
+
+
+@dataclass(slots=True)
+class CheckOptions:
+    # how long a working link's result is reused for, in seconds
+    ttl: float = 7 * 24 * 60 * 60
+    # the number of connections kept open to each host
+    connections_per_host: int = 4
+    # the number of requests started per second on each host
+    rate_per_host: float = 5.0
+    # the number of links being checked at once, across all hosts
+    concurrency: int = 256
+    # the time allowed for each request (including connecting), in seconds
+    timeout: float = 20.0
+
+
+@dataclass(slots=True)
+class Response:
+    status: int
+    # keyed on the lower-cased header name
+    headers: dict[str, str]
+
+
+type Connection = tuple[asyncio.StreamReader, asyncio.StreamWriter]
+
+
+class HostPool:
+    """The connections to a single origin: at most a fixed number are open at once, each is kept alive and reused
+    between requests, and requests are started no more often than the host's rate limit allows."""
+
+    def __init__(self, scheme: str, host: str, port: int, *, options: CheckOptions,
+                 ssl_context: ssl.SSLContext) -> None:
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self.options = options
+        self._ssl_context = ssl_context if scheme == "https" else None
+        self._host_header = host if port == (443 if scheme == "https" else 80) else f"{host}:{port}"
+
+        self._idle: list[Connection] = []
+        self._slots = asyncio.Semaphore(options.connections_per_host)
+        self._interval = 1 / options.rate_per_host if options.rate_per_host > 0 else 0.0
+        self._next_start = 0.0
+
+    def back_off(self, delay: float) -> None:
+        """Start no more requests on this host for the given number of seconds."""
+        self._next_start = max(self._next_start, asyncio.get_running_loop().time() + delay)
+
+    async def _wait_turn(self) -> None:
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        start = max(now, self._next_start)
+        self._next_start = start + self._interval
+
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    async def _connect(self) -> Connection:
+        return await asyncio.open_connection(self.host, self.port, ssl=self._ssl_context,
+                                             server_hostname=self.host if self._ssl_context else None)
+
+    async def request(self, method: str, target: str, headers: dict[str, str]) -> Response:
+        """Make a request over one of the pool's connections, returning the response's status and headers. Only the
+        headers are read: a response with a body is never reused, so its connection is closed instead."""
+        async with self._slots:
+            await self._wait_turn()
+
+            async with asyncio.timeout(self.options.timeout):
+                while True:
+                    reused = bool(self._idle)
+                    connection = self._idle.pop() if reused else await self._connect()
+
+                    try:
+                        response, keep_alive = await self._exchange(connection, method, target, headers)
+                    except (ConnectionError, EOFError):
+                        _close(connection)
+                        if reused:
+                            # the server closed the idle connection in the meantime, so try another
+                            continue
+                        raise
+                    except BaseException:
+                        _close(connection)
+                        raise
+
+                    if keep_alive:
+                        self._idle.append(connection)
+                    else:
+                        _close(connection)
+
+                    return response
+
+    async def _exchange(self, connection: Connection, method: str, target: str,
+                        headers: dict[str, str]) -> tuple[Response, bool]:
+        reader, writer = connection
+
+        lines = [f"{method} {target} HTTP/1.1", f"Host: {self._host_header}", f"User-Agent: {USER_AGENT}",
+                 "Accept: */*", "Connection: keep-alive", *(f"{name}: {value}" for name, value in headers.items())]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        await writer.drain()
+
+        while True:
+            version, status = _parse_status_line(await reader.readline())
+            response_headers = await _read_headers(reader)
+
+            # skip any interim responses
+            if not 100 <= status < 200:
+                break
+
+        bodiless = method == "HEAD" or status in (204, 304)
+        keep_alive = (bodiless and version == "HTTP/1.1"
+                      and response_headers.get("connection", "").lower() != "close")
+        return Response(status, response_headers), keep_alive
+
+    def close(self) -> None:
+        while self._idle:
+            _close(self._idle.pop())
+
+
+def _close(connection: Connection) -> None:
+    connection[1].close()
+
+
+def _retry_after(response: Response) -> float | None:
+    """Return how long to wait before retrying a request which the host throttled, or None if it was not."""
+    value = response.headers.get("retry-after")
+    if response.status not in THROTTLED_STATUSES or (value is None and response.status != 429):
+        return None
+
+    # either a number of seconds or an HTTP date
+    try:
+        delay = float(value) if value is not None else DEFAULT_RETRY_AFTER
+    except ValueError:
+        try:
+            delay = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            delay = DEFAULT_RETRY_AFTER
+
+    return min(max(delay, 0.0), MAX_RETRY_AFTER)
+
+
+def _parse_status_line(line: bytes) -> tuple[str, int]:
+    if not line:
+        raise EOFError("connection closed before the response")
+
+    parts = line.decode("latin-1").split(None, 2)
+    if len(parts) < 2 or not parts[0].startswith("HTTP/") or not parts[1].isdigit():
+        raise ValueError(f"malformed status line: {line!r}")
+
+    return parts[0], int(parts[1])
+
+
+async def _read_headers(reader: asyncio.StreamReader) -> dict[str, str]:
+    headers: dict[str, str] = {}
+
+    while line := (await reader.readline()).rstrip(b"\r\n"):
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    return headers
+
+
+class LinkChecker:
+    """Checks links concurrently, with a connection pool per origin, consulting (and updating) the result cache if
+    one is given."""
+
+    def __init__(self, options: CheckOptions, cache: ResultCache | None = None) -> None:
+        self.options = options
+        self.cache = cache
+        self._pools: dict[tuple[str, str, int], HostPool] = {}
+        self._ssl_context = ssl.create_default_context()
+
+    def _pool(self, url: str) -> tuple[HostPool, str]:
+        """Return the pool for the given URL's origin, and the request target for it."""
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError(f"not an http(s) URL: {url}")
+
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        key = (parts.scheme, parts.hostname, port)
+        if (pool := self._pools.get(key)) is None:
+            pool = self._pools[key] = HostPool(*key, options=self.options, ssl_context=self._ssl_context)
+
+        target = quote(parts.path or "/", safe=URL_SAFE)
+        if parts.query:
+            target += "?" + quote(parts.query, safe=URL_SAFE)
+
+        return pool, target
+
+    async def _fetch(self, url: str, method: str, headers: dict[str, str]) -> tuple[Response, str]:
+        """Request the given URL, following any redirects, and return the final response and URL. Requests which the
+        host throttles are retried (a bounded number of times) once it has been left alone for as long as it asks."""
+        for _ in range(MAX_REDIRECTS + 1):
+            pool, target = self._pool(url)
+            response = await pool.request(method, target, headers)
+
+            for _ in range(MAX_THROTTLED_RETRIES):
+                if (delay := _retry_after(response)) is None:
+                    break
+
+                pool.back_off(delay)
+                response = await pool.request(method, target, headers)
+
+            if response.status not in REDIRECT_STATUSES or "location" not in response.headers:
+                return response, url
+
+            url = urljoin(url, response.headers["location"])
+            # the validators are for the original URL's resource only
+            headers = {}
+
+        raise ValueError(f"more than {MAX_REDIRECTS} redirects")
+
+    async def check(self, url: str) -> LinkResult:
+        """Check a single link (or reuse its cached result, if it is still fresh)."""
+        now = time.time()
+        cached: LinkResult | None = None
+
+        if self.cache is not None:
+            if (fresh := self.cache.fresh(url, now)) is not None:
+                return fresh
+
+            cached = self.cache.get(url)
+
+        headers: dict[str, str] = {}
+        if cached is not None and cached.ok:
+            if cached.etag is not None:
+                headers["If-None-Match"] = cached.etag
+            if cached.last_modified is not None:
+                headers["If-Modified-Since"] = cached.last_modified
+
+        try:
+            response, final_url = await self._fetch(url, "HEAD", headers)
+            if response.status in HEAD_REFUSED_STATUSES:
+                response, final_url = await self._fetch(url, "GET", headers)
+        except (OSError, EOFError, ValueError) as e:
+            result = LinkResult(url=url, status=None, checked=now, error=str(e) or type(e).__name__)
+        else:
+            if response.status == 304 and cached is not None:
+                # unchanged since it was last checked
+                result = replace(cached, checked=now)
+            else:
+                result = LinkResult(url=url, status=response.status, checked=now,
+                                    etag=response.headers.get("etag"),
+                                    last_modified=response.headers.get("last-modified"),
+                                    final_url=final_url if final_url != url else None,
+                                    throttled=_retry_after(response) is not None)
+
+        # (a throttled check says nothing about the link, so any previous result is kept instead)
+        if self.cache is not None and not result.throttled:
+            self.cache.put(result)
+
+        return result
+
+    async def check_all(self, urls: Iterable[str]) -> dict[str, LinkResult]:
+        """Check every given link, returning their results in the same order."""
+        limit = asyncio.Semaphore(self.options.concurrency)
+
+        async def check(url: str) -> LinkResult:
+            async with limit:
+                return await self.check(url)
+
+        urls = list(urls)
+        try:
+            results = await asyncio.gather(*map(check, urls))
+        finally:
+            for pool in self._pools.values():
+                pool.close()
+
+        return dict(zip(urls, results))
+
+
+def extract_urls(scripts: Iterable[Script], audios: Iterable[FillData]) -> dict[str, list[str]]:
+    """Return every http(s) URL in the catalog, in order of first appearance, along with where each appears."""
+    found: dict[str, list[str]] = {}
+
+    def add(links: dict[str, str] | None, where: str) -> None:
+        for label, url in (links or {}).items():
+            if url and url.startswith(("http://", "https://")):
+                found.setdefault(url, []).append(f"{where} ({label})")
+
+    for script in scripts:
+        add(script.links.script, script.title)
+        add(script.links.post, script.title)
+
+        for fill in script.fills:
+            add(fill.links, f"{script.title}: fill by {', '.join(fill.creators)}")
+
+    for audio in audios:
+        add(audio.links, f"audio: {audio.title}")
+
+    return found
+
+
+def check_links(urls: Iterable[str], *, options: CheckOptions | None = None,
+                cache: ResultCache | None = None) -> dict[str, LinkResult]:
+    """Check the given links, returning the result for each."""
+    checker = LinkChecker(options or CheckOptions(), cache)
+    return asyncio.run(checker.check_all(urls))
+
+
+def main():
+    defaults = CheckOptions()
+
+    parser = ArgumentParser(description="Check every link in the catalog, reporting those which are broken.")
+    parser.add_argument("-d", "--data-file", type=Path, default=DATA_FILE, help="the .json data file to check")
+    parser.add_argument("--ttl", type=float, default=defaults.ttl / 3600, metavar="HOURS",
+                        help="reuse a working link's last result for this long before checking it again")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="check every link, ignoring (and not updating) the cached results")
+    parser.add_argument("--connections-per-host", type=int, default=defaults.connections_per_host, metavar="N",
+                        help="keep up to N connections open to each host")
+    parser.add_argument("--rate", type=float, default=defaults.rate_per_host, metavar="N",
+                        help="start at most N requests per second on each host (0 for no limit)")
+    parser.add_argument("--concurrency", type=int, default=defaults.concurrency, metavar="N",
+                        help="check up to N links at once")
+    parser.add_argument("--timeout", type=float, default=defaults.timeout, metavar="SECONDS",
+                        help="give up on a request after this long")
+    parser.add_argument("-o", "--out-file", type=Path, help="also write every result to this .json file")
+    args = parser.parse_args()
+
+    if args.connections_per_host < 1 or args.concurrency < 1:
+        parser.error("--connections-per-host and --concurrency must be positive")
+
+    options = CheckOptions(ttl=args.ttl * 3600, connections_per_host=args.connections_per_host,
+                           rate_per_host=args.rate, concurrency=args.concurrency, timeout=args.timeout)
+
+    data = load(args.data_file)
+    urls = extract_urls(data.scripts, data.audios)
+    cache = None if args.no_cache else ResultCache(RESULTS_CACHE, options.ttl)
+
+    start = time.perf_counter()
+    results = check_links(urls, options=options, cache=cache)
+    elapsed = time.perf_counter() - start
+
+    if cache is not None:
+        cache.save(urls, time.time())
+
+    broken = [result for result in results.values() if result.broken]
+    throttled = [result for result in results.values() if result.throttled]
+    for result in broken + throttled:
+        print(f"{result.describe()}: {result.url}")
+        for where in urls[result.url]:
+            print(f"    {where}")
+
+    cached = f" ({cache.hits} from cache)" if cache is not None else ""
+    print(f"checked {len(results)} links{cached} in {elapsed:.1f}s: {len(broken)} broken, "
+          f"{len(throttled)} inconclusive (throttled)")
+
+    if args.out_file is not None:
+        report = {url: {**asdict(result), "ok": result.ok, "found_in": urls[url]} for url, result in results.items()}
+        with recording_outputs():
+            write_text(json.dumps(report, indent=4), args.out_file)
+
+    sys.exit(1 if broken else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import os
+import sys
+from collections.abc import Callable, Iterable
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import Any
+
+import instrumentation
+from cache import CACHE_DIR
+from outputs import file_digest, remove_output, write_bytes, write_text
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# the kinds of file which are precompressed
+COMPRESSIBLE_SUFFIXES = {".html", ".json", ".css", ".js"}
+
+# the sibling written for each encoding, and how (both at maximum compression); the .gz output is reproducible,
+# since no timestamp is recorded in it
+ENCODERS: dict[str, Callable[[bytes], bytes]] = {".gz": partial(gzip.compress, compresslevel=9, mtime=0)}
+if brotli is not None:
+    ENCODERS[".br"] = partial(brotli.compress, quality=11)
+
+ENCODING_SUFFIXES = (".gz", ".br")
+
+# the content hash of each file as of its last compression, so that unchanged files are skipped
+MANIFEST = CACHE_DIR / "compressed.json"
+
+
+def compressible_files(directory: Path) -> list[Path]:
+    """Return the files directly within the given directory which should be precompressed.
+    Private data files (e.g., script-data-private.json) are never published, so are not compressed either."""
+    return sorted(path for path in directory.iterdir()
+                  if path.is_file() and path.suffix in COMPRESSIBLE_SUFFIXES and not path.stem.endswith("-private"))
+
+
+def remove_orphans(directory: Path) -> None:
+    """Remove any compressed siblings in the given directory whose original file no longer exists
+    (e.g., script chunks from a build with more of them)."""
+    for suffix in ENCODING_SUFFIXES:
+        for sibling in directory.glob(f"*{suffix}"):
+            if not sibling.with_suffix("").exists():
+                remove_output(sibling)
+
+
+def _read_manifest() -> dict[str, dict[str, Any]]:
+    try:
+        return json.loads(MANIFEST.read_bytes())
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _compress(path: Path, entry: dict[str, Any] | None) -> dict[str, Any] | None:
+    """Write the compressed siblings of the given file, unless they are up to date with its content according to
+    its manifest entry. Return its new manifest entry, or None if it was skipped."""
+    data = path.read_bytes()
+    new_entry = {"sha256": hashlib.sha256(data).hexdigest(), "encodings": sorted(ENCODERS)}
+
+    if entry == new_entry and all(path.with_name(path.name + suffix).exists() for suffix in ENCODERS):
+        return None
+
+    for suffix in ENCODING_SUFFIXES:
+        sibling = path.with_name(path.name + suffix)
+        if suffix in ENCODERS:
+            write_bytes(ENCODERS[suffix](data), sibling)
+        elif sibling.exists():
+            # there is no encoder for it (now), so any existing sibling would be stale
+            remove_output(sibling)
+
+    return new_entry
+
+
+def precompress(directories: Iterable[Path], *, jobs: int | None = None) -> None:
+    """Write compressed (.gz, and .br if brotli is installed) siblings of every compressible file in the given
+    directories, for hosts which cannot compress on the fly. Files whose content has not changed since they were last
+    compressed are skipped.
+
+    Files are compressed on a pool of threads (by default, one per CPU), since both zlib and brotli release the GIL
+    while compressing.
+    """
+    if brotli is None:
+        print("brotli is not installed, so only .gz siblings are written", file=sys.stderr)
+
+    manifest = _read_manifest()
+
+    files: list[Path] = []
+    for directory in directories:
+        remove_orphans(directory)
+        files.extend(compressible_files(directory))
+
+    keys = [str(path.resolve()) for path in files]
+    previous = [manifest.get(key) for key in keys]
+    jobs = min(jobs or os.cpu_count() or 1, max(len(files), 1))
+
+    with instrumentation.stage("precompress"):
+        if jobs == 1:
+            entries = list(map(_compress, files, previous))
+        else:
+            with ThreadPoolExecutor(jobs) as executor:
+                entries = list(executor.map(_compress, files, previous))
+
+    compressed = sum(entry is not None for entry in entries)
+    instrumentation.record_cache("precompress", hits=len(files) - compressed, misses=compressed)
+
+    # only the current files are kept, so the manifest never accumulates entries for files which have been removed
+    current = {key: entry if entry is not None else manifest[key] for key, entry in zip(keys, entries)}
+    if current != manifest:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        write_text(json.dumps(current, indent=4), MANIFEST, tracked=False)
+
+
+def remove_stale_siblings(directories: Iterable[Path]) -> None:
+    """Remove the compressed siblings in the given directories which are out of date with their original file, for
+    builds which do not precompress (hosts which serve precompressed siblings would otherwise serve stale content).
+    Siblings which are still up to date are kept for the next build which does."""
+    manifest = _read_manifest()
+
+    for directory in directories:
+        remove_orphans(directory)
+
+        for path in compressible_files(directory):
+            siblings = [path.with_name(path.name + suffix) for suffix in ENCODING_SUFFIXES]
+            siblings = [sibling for sibling in siblings if sibling.exists()]
+            if not siblings:
+                continue
+
+            entry = manifest.get(str(path.resolve()))
+            if entry is None or entry["sha256"] != file_digest(path):
+                for sibling in siblings:
+                    remove_output(sibling)
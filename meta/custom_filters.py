@@ -1,13 +1,20 @@
 from __future__ import annotations
 import re
+import sys
 from datetime import timedelta
+from functools import lru_cache
+from typing import TYPE_CHECKING
 
 import jinja2
 
-# a set containing tags that designate the script as NSFW
-NSFW_TAGS = {"18+", "nsfw", "r18"}
+if TYPE_CHECKING:
+    from builder import ESeriesData
 
+# a set containing tags that designate the script as NSFW (interned, like the tags parsed from the data)
+NSFW_TAGS = {sys.intern(tag) for tag in ("18+", "nsfw", "r18")}
 
+
+@lru_cache(maxsize=4096)
 def script_tag_classes(tag: str) -> str:
     """Determine the html classes that should be attached to this script tag.
 
@@ -54,6 +61,7 @@ def any_nsfw(tags: list[str]) -> bool:
     return bool(overlap)
 
 
+@lru_cache(maxsize=4096)
 def summarise_gender(audience: str) -> str:
     """Summarise the gender for a fill, based on the speaker."""
     if re.match(r"^M+4", audience):
@@ -66,6 +74,7 @@ def summarise_gender(audience: str) -> str:
     return gender
 
 
+@lru_cache(maxsize=4096)
 def serialise(text: str) -> str:
     patterns = {
         "~": "-",
@@ -93,18 +102,18 @@ def format_timedelta(t: timedelta | None) -> str:
     return f"{minutes:02.0f}:{seconds:02.0f}"
 
 
-def render_series(s: dict[str, str | int] | None) -> str:
+def render_series(s: ESeriesData | None) -> str:
     if s is None:
         return ""
 
-    return str(s.get("title", ""))
+    return str(s.title)
 
 
-def render_series_index(s: dict[str, str | int] | None) -> str:
+def render_series_index(s: ESeriesData | None) -> str:
     if s is None:
         return ""
 
-    return str(s.get("index", ""))
+    return str(s.index)
 
 
 
@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import shutil
+import tempfile
+from functools import cache
+from pathlib import Path
+
+import jinja2
+
+from cache import CACHE_DIR, digest_files
+from custom_filters import add_all_filters
+
+BYTECODE_DIR = CACHE_DIR / "bytecode"
+COMPILED_DIR = CACHE_DIR / "compiled"
+
+
+def _make_environment(loader: jinja2.BaseLoader) -> jinja2.Environment:
+    BYTECODE_DIR.mkdir(parents=True, exist_ok=True)
+
+    env = jinja2.Environment(
+        loader=loader,
+        autoescape=jinja2.select_autoescape(),
+        # bytecode is keyed on the template's path and validated against a checksum of its source
+        bytecode_cache=jinja2.FileSystemBytecodeCache(str(BYTECODE_DIR)),
+    )
+    add_all_filters(env)
+
+    return env
+
+
+def precompile_templates(template_dir: Path) -> Path:
+    """Compile every template in the given directory to a Python module, returning the directory containing them.
+
+    Compiled modules are stored per digest of the template sources, so they are only regenerated when a template
+    actually changes.
+    """
+    target = COMPILED_DIR / digest_files(template_dir.glob("*.html"))
+    if target.is_dir():
+        return target
+
+    env = _make_environment(jinja2.FileSystemLoader(str(template_dir)))
+
+    # compile into a scratch directory first so that an interrupted run never leaves a partial module set behind
+    COMPILED_DIR.mkdir(parents=True, exist_ok=True)
+    scratch = Path(tempfile.mkdtemp(dir=COMPILED_DIR))
+    try:
+        env.compile_templates(str(scratch), zip=None)
+        scratch.rename(target)
+    except OSError:
+        shutil.rmtree(scratch, ignore_errors=True)
+        # another process (e.g., a worker, or watch.py) compiled the same templates first
+        if target.is_dir():
+            return target
+        raise
+    except BaseException:
+        shutil.rmtree(scratch, ignore_errors=True)
+        raise
+
+    return target
+
+
+@cache
+def get_environment(template_dir: Path, *, precompiled: bool = False) -> jinja2.Environment:
+    """Return the shared environment for rendering the templates in the given directory.
+
+    If precompiled is set, templates are loaded from Python modules compiled by precompile_templates rather than
+    from their sources.
+    """
+    if precompiled:
+        loader: jinja2.BaseLoader = jinja2.ModuleLoader(str(precompile_templates(template_dir)))
+    else:
+        loader = jinja2.FileSystemLoader(str(template_dir))
+
+    return _make_environment(loader)
@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import base64
+from collections import defaultdict
+from collections.abc import Iterable
+from typing import TYPE_CHECKING, Any
+
+from parser import count_speakers
+
+if TYPE_CHECKING:
+    from builder import EScriptData
+
+
+def encode_bitset(positions: Iterable[int], size: int) -> str:
+    """Encode the bitset of the given script positions (bit i set <=> script i is included) for script.js:
+    base64 of its little-endian 32-bit words."""
+    num_words = (size + 31) // 32
+    bits = bytearray(num_words * 4)
+
+    for i in positions:
+        bits[i >> 3] |= 1 << (i & 7)
+
+    return base64.b64encode(bits).decode("ascii")
+
+
+def make_facet_index(scripts: list[EScriptData]) -> dict[str, Any]:
+    """Return the facet index for the non-text filters on the index page.
+
+    Scripts are referred to by their position in the page. Every filter option has a bitset of the scripts it selects,
+    so script.js can evaluate the filters with bitwise operations rather than by reading each script's attributes.
+    Word counts are given as the script positions sorted by word count, alongside the sorted word counts themselves,
+    so that a range of word counts is a pair of binary searches.
+    """
+    size = len(scripts)
+
+    audience: defaultdict[str, set[int]] = defaultdict(set)
+    speakers: defaultdict[int, set[int]] = defaultdict(set)
+    series: defaultdict[str, list[int]] = defaultdict(list)
+    filled_by: defaultdict[str, list[int]] = defaultdict(list)
+    in_series: list[int] = []
+    filled: list[int] = []
+    nsfw: list[int] = []
+
+    for i, script in enumerate(scripts):
+        for tag in script.audience_tags:
+            audience[tag.upper()].add(i)
+            speakers[count_speakers(tag)].add(i)
+
+        if script.series is not None:
+            series[script.series.title].append(i)
+            in_series.append(i)
+
+        for va in script.filled_by:
+            filled_by[va].append(i)
+
+        if script.fills:
+            filled.append(i)
+
+        if script.nsfw:
+            nsfw.append(i)
+
+    by_wordcount = sorted(range(size), key=lambda i: scripts[i].wordcount)
+
+    return {
+        "size": size,
+        "ids": [script.slug for script in scripts],
+        "numFills": [len(script.fills) for script in scripts],
+        "audience": {tag: encode_bitset(positions, size) for tag, positions in sorted(audience.items())},
+        "speakers": {str(count): encode_bitset(positions, size) for count, positions in sorted(speakers.items())},
+        "series": {title: encode_bitset(positions, size) for title, positions in sorted(series.items())},
+        "inSeries": encode_bitset(in_series, size),
+        "filledBy": {va: encode_bitset(positions, size) for va, positions in sorted(filled_by.items())},
+        "filled": encode_bitset(filled, size),
+        "nsfw": encode_bitset(nsfw, size),
+        "wordcountOrder": by_wordcount,
+        "wordcounts": [scripts[i].wordcount for i in by_wordcount],
+    }
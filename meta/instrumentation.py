@@ -0,0 +1,193 @@
+from __future__ import annotations
+
+import cProfile
+import json
+import threading
+import time
+from collections import Counter
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any
+
+# ----------------------------------------------------------------------------------------------------------------------
+# build instrumentation
+#
+# The build records into a single process-wide report: the wall time spent in each stage, counts of the items it
+# processed, and the hits and misses of each cache. Per-template render timings are only recorded while profiling,
+# and only within this process (fragments rendered by worker processes are not timed).
+# ----------------------------------------------------------------------------------------------------------------------
+_lock = threading.Lock()
+_stages: dict[str, float] = {}
+_counts: Counter[str] = Counter()
+_caches: dict[str, Counter[str]] = {}
+_templates: dict[str, Counter[str]] = {}
+_minified: dict[str, Counter[str]] = {}
+_outputs: dict[str, str] = {}
+_timing_templates = False
+
+
+def reset() -> None:
+    """Discard everything recorded so far."""
+    global _timing_templates
+
+    with _lock:
+        _stages.clear()
+        _counts.clear()
+        _caches.clear()
+        _templates.clear()
+        _minified.clear()
+        _outputs.clear()
+        _timing_templates = False
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Add the wall time spent within this block to the given stage."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        with _lock:
+            _stages[name] = _stages.get(name, 0) + elapsed
+
+
+def count(name: str, n: int = 1) -> None:
+    """Add n to the given count."""
+    with _lock:
+        _counts[name] += n
+
+
+def record_cache(name: str, *, hits: int = 0, misses: int = 0) -> None:
+    """Add the given numbers of hits and misses to the given cache's statistics."""
+    with _lock:
+        stats = _caches.setdefault(name, Counter())
+        stats["hits"] += hits
+        stats["misses"] += misses
+
+
+def timing_templates() -> bool:
+    """Return whether per-template render timings are being recorded."""
+    return _timing_templates
+
+
+def record_render(template_name: str, seconds: float) -> None:
+    """Record one render of the given template, which took the given time."""
+    with _lock:
+        stats = _templates.setdefault(template_name, Counter())
+        stats["renders"] += 1
+        stats["seconds"] += seconds
+
+
+def timed_stream(template_name: str, stream: Iterator[str]) -> Iterator[str]:
+    """Pass through a stream of rendered text, recording the time spent producing it (but not consuming it) against
+    the given template. This includes the time taken to render any fragments the stream pulls in."""
+    elapsed = 0.0
+    start = time.perf_counter()
+
+    for chunk in stream:
+        elapsed += time.perf_counter() - start
+        yield chunk
+        start = time.perf_counter()
+
+    elapsed += time.perf_counter() - start
+    record_render(template_name, elapsed)
+
+
+def record_minified(name: str, *, before: int, after: int) -> None:
+    """Record the size in bytes of the given output before and after minification."""
+    with _lock:
+        sizes = _minified.setdefault(name, Counter())
+        sizes["before"] += before
+        sizes["after"] += after
+
+
+def record_output(path: str, status: str) -> None:
+    """Record what became of the given output: "added", "changed", "unchanged" or "removed"."""
+    with _lock:
+        _outputs[path] = status
+
+
+# the order in which output statuses are reported
+OUTPUT_STATUSES = ("added", "changed", "unchanged", "removed")
+
+
+def outputs() -> dict[str, list[str]]:
+    """Return the outputs recorded so far, grouped by status."""
+    with _lock:
+        return {status: sorted(path for path, s in _outputs.items() if s == status) for status in OUTPUT_STATUSES}
+
+
+def outputs_summary() -> str:
+    """Return a one-line summary of the outputs recorded so far, e.g. "1 added, 2 changed, 5 unchanged, 0 removed"."""
+    return ", ".join(f"{len(paths)} {status}" for status, paths in outputs().items())
+
+
+def report(total_seconds: float | None = None) -> dict[str, Any]:
+    """Return everything recorded so far, as a JSON-serialisable report."""
+    grouped = outputs()
+
+    with _lock:
+        caches = {
+            name: {
+                "hits": stats["hits"],
+                "misses": stats["misses"],
+                "hit_rate": stats["hits"] / lookups if (lookups := stats["hits"] + stats["misses"]) else None,
+            }
+            for name, stats in sorted(_caches.items())
+        }
+
+        minified = {
+            name: {
+                "before": sizes["before"],
+                "after": sizes["after"],
+                "reduction": 1 - sizes["after"] / sizes["before"] if sizes["before"] else None,
+            }
+            for name, sizes in sorted(_minified.items())
+        }
+
+        return {
+            "total_seconds": total_seconds,
+            "stages": dict(_stages),
+            "counts": dict(sorted(_counts.items())),
+            "caches": caches,
+            "templates": {name: dict(stats) for name, stats in sorted(_templates.items())},
+            "minified": minified,
+            "outputs": grouped,
+        }
+
+
+@contextmanager
+def session(report_file: Path, *, profile: bool = False) -> Iterator[None]:
+    """Record a build, writing its report to the given file once it has finished successfully.
+
+    If profile is set, per-template render timings are recorded too, and the build is run under cProfile, whose
+    statistics are dumped alongside the report (with a .prof suffix) for e.g. pstats or snakeviz.
+    """
+    global _timing_templates
+
+    reset()
+    _timing_templates = profile
+    profiler = cProfile.Profile() if profile else None
+
+    start = time.perf_counter()
+    if profiler is not None:
+        profiler.enable()
+
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        _timing_templates = False
+
+    result = report(total_seconds=time.perf_counter() - start)
+
+    report_file.parent.mkdir(parents=True, exist_ok=True)
+    if profiler is not None:
+        profile_file = report_file.with_suffix(".prof")
+        profiler.dump_stats(profile_file)
+        result["profile"] = str(profile_file)
+
+    report_file.write_text(json.dumps(result, indent=4), encoding="utf-8")
@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import json
+import re
+from dataclasses import dataclass
+from functools import cache, lru_cache
+from pathlib import Path
+
+# the hosting platforms links are recognised on, in order of precedence: each gives the label prefixes which identify
+# it (for its icon) and, optionally, how to embed its links ("embed") and the hosts of a script's primary link
+# ("primary")
+PLATFORMS_FILE = Path(__file__).parent / "link_platforms.json"
+
+
+@dataclass(slots=True, frozen=True)
+class LinkClass:
+    icons: tuple[str, ...]
+    embed: str | None
+    primary: bool
+
+
+@dataclass(slots=True, frozen=True)
+class _Rules:
+    # each label prefix, as a named alternative (p<i> for the i-th platform)
+    labels: re.Pattern[str]
+    icons: dict[str, tuple[str, ...]]
+    # each embed pattern, as a named alternative (p<i> for the i-th platform), whose own groups follow it
+    embeds: re.Pattern[str] | None
+    embed_urls: dict[str, tuple[str, range]]
+    primary: re.Pattern[str] | None
+
+
+def _alternation(alternatives: list[str]) -> re.Pattern[str] | None:
+    return re.compile("|".join(alternatives)) if alternatives else None
+
+
+@cache
+def _rules() -> _Rules:
+    """Compile the platform rules into one pattern per question, so that classifying a link costs a single match
+    however many platforms there are."""
+    platforms = json.loads(PLATFORMS_FILE.read_bytes())
+
+    labels: list[str] = []
+    icons: dict[str, tuple[str, ...]] = {}
+    embeds: list[str] = []
+    embed_urls: dict[str, tuple[str, range]] = {}
+    primary: list[str] = []
+    group = 1
+
+    for i, platform in enumerate(platforms):
+        name = f"p{i}"
+        labels.append(f"(?P<{name}>{'|'.join(map(re.escape, platform['labels']))})")
+        icons[name] = tuple(platform["icon"])
+        primary.extend(map(re.escape, platform.get("primary", [])))
+
+        if (embed := platform.get("embed")) is not None:
+            inner = re.compile(embed["pattern"]).groups
+            embeds.append(f"(?P<{name}>{embed['pattern']})")
+            embed_urls[name] = (embed["url"], range(group + 1, group + 1 + inner))
+            group += 1 + inner
+
+    return _Rules(
+        labels=re.compile("|".join(labels)),
+        icons=icons,
+        embeds=_alternation(embeds),
+        embed_urls=embed_urls,
+        primary=_alternation(primary),
+    )
+
+
+@lru_cache(maxsize=256)
+def icon_classes(label: str) -> tuple[str, ...]:
+    """Return the Font Awesome classes of the icon for a link with the given label."""
+    rules = _rules()
+    if (match := rules.labels.match(label)) is None:
+        raise ValueError(f"unknown label: {label}")
+
+    return rules.icons[match.lastgroup]
+
+
+def _embed_url(href: str) -> str | None:
+    rules = _rules()
+    if rules.embeds is None or (match := rules.embeds.search(href)) is None:
+        return None
+
+    # the platform's own groups capture the media's id, or else it is the whole match
+    url, groups = rules.embed_urls[match.lastgroup]
+    return url.format(next((value for i in groups if (value := match.group(i))), match.group(match.lastgroup)))
+
+
+@lru_cache(maxsize=8192)
+def classify_link(label: str, href: str) -> LinkClass:
+    """Classify a link by its label and href: the icon to show for it, the URL to embed it with (if its platform
+    supports that), and whether it is the primary link of the script it belongs to."""
+    rules = _rules()
+    return LinkClass(
+        icons=icon_classes(label),
+        embed=_embed_url(href),
+        primary=rules.primary is not None and rules.primary.search(href) is not None,
+    )
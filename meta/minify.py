@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import re
+from collections.abc import Iterable, Iterator
+
+import instrumentation
+
+# HTML's whitespace characters (unlike \s, this excludes e.g. non-breaking spaces, which are significant)
+WHITESPACE = " \t\n\r\f"
+
+# the tokens of the page outside raw elements: runs of whitespace, runs of text (up to the next tag or run of whitespace
+# other than a single space, which cannot be collapsed any further), comments, and complete tags (or doctypes), whose
+# quoted attribute values may contain anything but their own quote
+TOKEN = re.compile(rf"""
+    (?P<space>[{WHITESPACE}]+)
+    | (?P<text>[^<{WHITESPACE}]+(?:\ [^<{WHITESPACE}]+)*)
+    | (?P<comment><!--.*?-->)
+    | (?P<tag><[A-Za-z/!?](?:[^>"']++|"[^"]*+"|'[^']*+')*+>)
+""", re.DOTALL | re.VERBOSE)
+
+# the start of a tag which has not been completely received yet
+PARTIAL_TAG = re.compile(r"""<[A-Za-z/!?](?:[^>"']++|"[^"]*+"|'[^']*+')*+(?:"[^"]*+|'[^']*+)?\Z""")
+
+# within a tag, the quoted attribute values (which are kept as they are) and the whitespace between attributes
+TAG_SPACE = re.compile(rf"""("[^"]*"|'[^']*')|[{WHITESPACE}]+""")
+TAG_NAME = re.compile(r"<([A-Za-z][A-Za-z0-9-]*)")
+
+# the elements whose content is kept exactly as it is
+RAW_ELEMENTS = {"pre", "textarea", "script", "style"}
+RAW_END = {name: re.compile(rf"</{name}\s*>", re.IGNORECASE) for name in RAW_ELEMENTS}
+
+# how far from the end of the received content a raw element's end tag could have started, and not yet be complete
+RAW_END_LOOKBEHIND = 16
+
+
+def _normalise_tag(tag: str) -> str:
+    """Collapse the whitespace between a tag's attributes (but not within their values)."""
+    if "\n" not in tag and "  " not in tag:
+        return tag
+
+    tag = TAG_SPACE.sub(lambda m: m.group(1) or " ", tag)
+    return tag[:-2] + ">" if tag.endswith(" >") else tag
+
+
+class HtmlMinifier:
+    """An incremental HTML minifier, for output which is produced (and written) a chunk at a time.
+
+    Comments are removed (other than conditional comments), and every other run of whitespace is collapsed to a single
+    newline (if it contained one) or space, which renders identically in normal text flow. The content of <pre>,
+    <textarea>, <script> and <style> elements is kept exactly as it is, as are attribute values. Only an incomplete tag
+    or comment at the end of a chunk is held back until the next, so memory use does not grow with the page.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._space: str | None = None
+        self._started = False
+        self._raw_end: re.Pattern[str] | None = None
+
+    def feed(self, chunk: str) -> str:
+        """Add the next chunk of the page, returning as much minified output as can be determined so far."""
+        # template streams yield Markup for autoescaped values, and str + Markup would escape the buffered text
+        self._buffer += str(chunk)
+        return self._process(final=False)
+
+    def close(self) -> str:
+        """Return the rest of the minified output, once the whole page has been fed."""
+        out = self._process(final=True)
+        if self._space == "\n" and self._started:
+            out += "\n"
+
+        self._space = None
+        return out
+
+    def _process(self, *, final: bool) -> str:
+        buf = self._buffer
+        n = len(buf)
+        pos = 0
+        out: list[str] = []
+        # the whitespace to write before the next token, if any (deferred so that consecutive runs, e.g. either side of
+        # a removed comment, are merged)
+        space = self._space
+        started = self._started
+
+        while pos < n:
+            if self._raw_end is not None:
+                match = self._raw_end.search(buf, pos)
+                if match is not None:
+                    out.append(buf[pos:match.end()])
+                    pos = match.end()
+                    self._raw_end = None
+                    continue
+
+                # keep back anything which could be the start of the end tag
+                end = n if final else buf.rfind("<", max(pos, n - RAW_END_LOOKBEHIND))
+                if end == -1:
+                    end = n
+
+                out.append(buf[pos:end])
+                pos = end
+                break
+
+            match = TOKEN.match(buf, pos)
+
+            if match is None:
+                # a "<" which does not start a complete tag or comment: it may just not have been received in full yet
+                if not final and (pos + 1 == n or buf.startswith("<!--", pos) or PARTIAL_TAG.match(buf, pos)):
+                    break
+
+                # otherwise, it is just text (e.g., "<3")
+                token = "<"
+                pos += 1
+            else:
+                kind = match.lastgroup
+                token = match.group()
+                pos = match.end()
+
+                if kind == "space":
+                    if space != "\n":
+                        space = "\n" if "\n" in token else " "
+                    continue
+
+                if kind == "comment":
+                    if not (token.startswith("<!--[if") or token.endswith("<![endif]-->")):
+                        continue
+                elif kind == "tag":
+                    if (name := TAG_NAME.match(token)) and name.group(1).lower() in RAW_ELEMENTS and token[-2] != "/":
+                        self._raw_end = RAW_END[name.group(1).lower()]
+
+                    token = _normalise_tag(token)
+
+            if space is not None and started:
+                out.append(space)
+            space = None
+            started = True
+            out.append(token)
+
+        self._buffer = buf[pos:]
+        self._space = space
+        self._started = started
+        return "".join(out)
+
+
+def minify_stream(chunks: Iterable[str], *, name: str | None = None) -> Iterator[str]:
+    """Minify a stream of HTML as it is produced. If a name is given, the page's size before and after minification
+    is recorded in the build report under it."""
+    minifier = HtmlMinifier()
+    before = after = 0
+
+    for chunk in chunks:
+        out = minifier.feed(chunk)
+        before += len(chunk.encode("utf-8"))
+        if out:
+            after += len(out.encode("utf-8"))
+            yield out
+
+    out = minifier.close()
+    after += len(out.encode("utf-8"))
+    yield out
+
+    if name is not None:
+        instrumentation.record_minified(name, before=before, after=after)
+
+
+def minify(html: str) -> str:
+    """Minify a complete HTML document or fragment."""
+    minifier = HtmlMinifier()
+    return minifier.feed(html) + minifier.close()
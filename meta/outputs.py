@@ -0,0 +1,203 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import stat
+import tempfile
+import threading
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO, Any
+
+import instrumentation
+from cache import CACHE_DIR
+
+# the size of the write buffer used for generated files
+WRITE_BUFFER_SIZE = 1 << 16
+
+# the permissions given to newly created outputs (mkstemp would otherwise leave them readable only by their owner)
+DEFAULT_MODE = 0o644
+
+# the content hash of every output (along with its size and modification time) as of when it was last written
+MANIFEST = CACHE_DIR / "outputs.json"
+
+
+class BuildManifest:
+    """The record of every output's content, so that an output whose content has not changed is not rewritten: its
+    modification time is kept, and deploys do not upload it again.
+
+    An output's recorded hash is only trusted while its size and modification time are as recorded; if the file has
+    been changed behind the manifest's back, its actual content is hashed instead.
+
+    Changes to the manifest are only kept in memory until it is saved, once per build (see recording_outputs).
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._dirty = False
+
+        try:
+            entries: dict[str, dict[str, Any]] = json.loads(path.read_bytes())
+        except (FileNotFoundError, ValueError):
+            entries = {}
+
+        # outputs which have since been removed (e.g., by hand) are forgotten
+        self._entries = {key: entry for key, entry in entries.items() if Path(key).exists()}
+
+    def status(self, path: Path, digest: str) -> str:
+        """Return whether the given content (by hash) for the given output would be "added", "changed" or left
+        "unchanged"."""
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            return "added"
+
+        with self._lock:
+            entry = self._entries.get(str(path.resolve()))
+
+        if entry is not None and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+            current = entry["sha256"]
+        else:
+            current = file_digest(path)
+
+        return "unchanged" if current == digest else "changed"
+
+    def record(self, path: Path, digest: str) -> None:
+        """Record the given output's content (by hash), as now written."""
+        st = path.stat()
+        entry = {"sha256": digest, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+        key = str(path.resolve())
+
+        with self._lock:
+            # (an output left unchanged normally already has this entry)
+            if self._entries.get(key) != entry:
+                self._entries[key] = entry
+                self._dirty = True
+
+    def forget(self, path: Path) -> None:
+        """Remove the given output's entry, once the output itself has been removed."""
+        with self._lock:
+            if self._entries.pop(str(path.resolve()), None) is not None:
+                self._dirty = True
+
+    def save(self) -> None:
+        """Write the manifest out, if anything has been recorded or forgotten since it was last saved."""
+        with self._lock:
+            if not self._dirty:
+                return
+
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            temp = self.path.with_name(f".{self.path.name}.tmp")
+            temp.write_text(json.dumps(self._entries, indent=4, sort_keys=True), encoding="utf-8")
+            temp.replace(self.path)
+            self._dirty = False
+
+
+_manifest: BuildManifest | None = None
+_manifest_lock = threading.Lock()
+
+
+def build_manifest() -> BuildManifest:
+    """Return the build manifest, reading it on first use."""
+    global _manifest
+
+    with _manifest_lock:
+        if _manifest is None:
+            _manifest = BuildManifest(MANIFEST)
+
+        return _manifest
+
+
+@contextmanager
+def recording_outputs() -> Iterator[BuildManifest]:
+    """Save the build manifest once the outputs written within have been recorded in it. It is saved even if the
+    build fails part way, so that the outputs which were written are not hashed again next time."""
+    manifest = build_manifest()
+    try:
+        yield manifest
+    finally:
+        manifest.save()
+
+
+def file_digest(path: Path) -> str:
+    """Return the content hash of the given file."""
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+@contextmanager
+def atomic_writer(path: Path, *, binary: bool = False, tracked: bool = True) -> Iterator[IO[Any]]:
+    """Open a file for writing which replaces the given path only once it has been completely written.
+
+    The content goes to a temporary file in the same directory, which is renamed over the target on success (and
+    removed on failure), so an interrupted build never leaves a half-written output behind.
+
+    Outputs are tracked in the build manifest unless tracked is unset (e.g., for the build's own caches): if the new
+    content is identical to the existing file's, the temporary file is discarded and the existing file left untouched.
+    Whether each tracked output was added, changed or left unchanged is recorded in the build report.
+    """
+    fd, temp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    temp = Path(temp_name)
+
+    try:
+        f: IO[Any]
+        if binary:
+            f = open(fd, mode="wb", buffering=WRITE_BUFFER_SIZE)
+        else:
+            f = open(fd, mode="w", encoding="utf-8", buffering=WRITE_BUFFER_SIZE)
+
+        with f:
+            yield f
+
+        status = None
+        if tracked:
+            manifest = build_manifest()
+            digest = file_digest(temp)
+            status = manifest.status(path, digest)
+
+        if status == "unchanged":
+            temp.unlink()
+        else:
+            try:
+                mode = stat.S_IMODE(path.stat().st_mode)
+            except FileNotFoundError:
+                mode = DEFAULT_MODE
+
+            temp.chmod(mode)
+            instrumentation.count("files_written")
+            instrumentation.count("bytes_written", temp.stat().st_size)
+            temp.replace(path)
+
+        if status is not None:
+            manifest.record(path, digest)
+            instrumentation.record_output(str(path), status)
+    except BaseException:
+        temp.unlink(missing_ok=True)
+        raise
+
+
+def write_stream(chunks: Iterable[str], path: Path, *, tracked: bool = True) -> None:
+    """Atomically write the given chunks of text (e.g., from Template.generate) to the given path, as they arrive."""
+    with atomic_writer(path, tracked=tracked) as f:
+        f.writelines(chunks)
+
+
+def write_text(text: str, path: Path, *, tracked: bool = True) -> None:
+    """Atomically write the given text to the given path."""
+    with atomic_writer(path, tracked=tracked) as f:
+        f.write(text)
+
+
+def write_bytes(data: bytes, path: Path, *, tracked: bool = True) -> None:
+    """Atomically write the given bytes to the given path."""
+    with atomic_writer(path, binary=True, tracked=tracked) as f:
+        f.write(data)
+
+
+def remove_output(path: Path) -> None:
+    """Remove an output which is no longer generated, recording its removal in the build report."""
+    path.unlink()
+    build_manifest().forget(path)
+    instrumentation.record_output(str(path), "removed")
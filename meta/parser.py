@@ -2,23 +2,68 @@ from __future__ import annotations
 
 import json
 import re
-from dataclasses import dataclass, field
-from datetime import datetime, timedelta
+import sys
+import types
+from collections.abc import Callable, Iterable, Mapping
+from dataclasses import MISSING, dataclass, field, fields, is_dataclass
+from datetime import date, datetime, timedelta
+from functools import lru_cache, partial
 from pathlib import Path
-from typing import Any, Self
+from typing import Any, Self, Union, get_args, get_origin, get_type_hints
 
-import dateparser
+import instrumentation
 
+# the author recorded against any script which does not name its own
+DEFAULT_AUTHORS = ("lilellia",)
 
-@dataclass
+DURATION_PATTERN = re.compile(r"(?P<hours>\d+h)?(?P<minutes>\d+m)(?P<seconds>\d+s)")
+
+
+@lru_cache(maxsize=4096)
+def parse_date(date_str: str | date, *, strict: bool = False) -> datetime | None:
+    """Parse a date string, as written by update_json (%Y-%m-%d), into a datetime.
+
+    Dates loaded directly from the source .yaml file are already date objects, and are only converted to datetimes.
+    ISO 8601 strings are decoded directly. Anything else falls back to dateparser (imported only when needed,
+    since importing it is expensive), unless strict is set, in which case a ValueError is raised instead.
+    Repeated strings are served from a cache.
+    """
+    if isinstance(date_str, datetime):
+        return date_str
+
+    if isinstance(date_str, date):
+        return datetime(date_str.year, date_str.month, date_str.day)
+
+    if not date_str:
+        return None
+
+    try:
+        return datetime.fromisoformat(date_str)
+    except ValueError:
+        if strict:
+            raise ValueError(f"invalid ISO date: {date_str!r}") from None
+
+    import dateparser
+    instrumentation.count("dateparser_fallbacks")
+    return dateparser.parse(date_str)
+
+
+@lru_cache(maxsize=1024)
+def count_speakers(audience_tag: str) -> int:
+    """Determine the number of speakers specified in the audience tag. Repeated tags are served from a cache."""
+    matches = re.findall(r"TM|TF|TA|NB|M|F|A", audience_tag.split("4")[0])
+    return len(matches)
+
+
+@dataclass(slots=True, frozen=True)
 class SeriesData:
-    title: str
+    title: str = field(metadata={"intern": True})
     index: int
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class WordCountData:
-    spoken: dict[str, int]
+    spoken: dict[str, int] = field(metadata={"intern": True})
     total: int
 
     @property
@@ -27,10 +72,10 @@ class WordCountData:
         return sum(self.spoken.values())
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class LinkData:
-    script: dict[str, str]
-    post: dict[str, str]
+    script: dict[str, str] = field(metadata={"intern": True})
+    post: dict[str, str] = field(metadata={"intern": True})
 
     def combine_dict(self) -> dict[str, str]:
         return {**self.script, **self.post}
@@ -41,21 +86,22 @@ class LinkData:
         return self.post[key]
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class FillData:
     script: ScriptFingerprint
-    creators: list[str]
+    creators: tuple[str, ...] = field(metadata={"intern": True})
     title: str
-    audience: str
-    links: dict[str, str] | None
-    date: datetime | None
-    duration: timedelta | None
+    audience: str = field(metadata={"intern": True})
+    links: dict[str, str] | None = field(metadata={"intern": True})
+    date: datetime | None = field(metadata={"missing": lambda: None})
+    duration: timedelta | None = field(metadata={"missing": lambda: ""})
     label: str | None = None
     private: bool = False
 
     @staticmethod
+    @lru_cache(maxsize=4096)
     def parse_duration(duration_str: str) -> timedelta:
-        match = re.match(r"(?P<hours>\d+h)?(?P<minutes>\d+m)(?P<seconds>\d+s)", duration_str)
+        match = DURATION_PATTERN.match(duration_str)
 
         if not match:
             raise ValueError(f"invalid duration value: {duration_str!r}")
@@ -71,49 +117,30 @@ class FillData:
         return timedelta(hours=int(hours), minutes=int(minutes), seconds=float(seconds))
 
     @classmethod
-    def from_dict(cls, data: dict[str, Any]) -> Self:
-        # process duration value
-        duration_str = data.pop("duration", "")
-        try:
-            duration = cls.parse_duration(duration_str)
-        except ValueError as e:
-            raise ValueError(f"cannot parse duration: {duration_str!r}; context: {data}")
-
-        # process date value
-        date_str = data.pop("date", "")
-        date = dateparser.parse(date_str)
-
-        # make fingerprint
-        if isinstance(data["script"], dict):
-            data["script"] = ScriptFingerprint(
-                title=data["script"]["title"],
-                authors=data["script"].get("authors", ["lilellia"]),
-                canonical_link=data["script"]["link"],
-            )
-
-        return cls(**data, duration=duration, date=date)
-
-
-@dataclass
+    def from_dict(cls, data: Mapping[str, Any], *, strict_dates: bool = False) -> Self:
+        return decode(cls, data, strict_dates=strict_dates)
+
+
+@dataclass(slots=True, frozen=True)
 class ScriptFingerprint:
     title: str
-    authors: list[str]
-    canonical_link: str
+    authors: tuple[str, ...] = field(metadata={"missing": lambda: DEFAULT_AUTHORS, "intern": True})
+    canonical_link: str = field(metadata={"key": "link"})
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class Script:
     title: str
-    authors: list[str]
-    audience: list[str]
-    tags: list[str]
+    authors: tuple[str, ...] = field(metadata={"missing": lambda: DEFAULT_AUTHORS, "intern": True})
+    audience: tuple[str, ...] = field(metadata={"intern": True})
+    tags: tuple[str, ...] = field(metadata={"intern": True})
     series: SeriesData | None
     summary: str
     words: WordCountData
     finished: datetime | None
     published: datetime | None
     links: LinkData
-    attendant_va: list[str] | None = None
+    attendant_va: tuple[str, ...] | None = field(default=None, metadata={"key": "attendant VA", "intern": True})
     fills: list[FillData] = field(default_factory=list)
     notes: str | None = None
 
@@ -126,53 +153,17 @@ class Script:
         )
 
     @classmethod
-    def from_dict(cls, data: dict[str, Any]) -> Self:
-        authors = data.pop("authors", ["lilellia"])
-
-        series = data.pop("series", None)
-        if series:
-            series = SeriesData(**series)
-
-        words = data.pop("words", None)
-        if words:
-            words = WordCountData(**words)
-
-        finished = data.pop("finished", None)
-        if finished:
-            finished = dateparser.parse(finished)
-
-        published = data.pop("published", None)
-        if published:
-            published = dateparser.parse(published)
-
-        links = data.pop("links", None)
-        if links:
-            links = LinkData(**links)
-
+    def from_dict(cls, data: Mapping[str, Any], *, strict_dates: bool = False) -> Self:
+        # the fills refer back to this script by its fingerprint, so they are decoded with it supplied
+        links = decode(LinkData, data["links"])
         fingerprint = ScriptFingerprint(
             title=data["title"],
-            authors=data.get("authors", ["lilellia"]),
+            authors=intern_all(data.get("authors", DEFAULT_AUTHORS)),
             canonical_link=links.canonical_link,
         )
+        fills = [decode(FillData, f, strict_dates=strict_dates, script=fingerprint) for f in data.get("fills", [])]
 
-        fill_data: list[dict[str, Any]] = data.pop("fills", [])
-        fills: list[FillData] = []
-        for f in fill_data:
-            fills.append(FillData.from_dict({"script": fingerprint, **f}))
-
-        attendant_va = data.pop("attendant VA", None)
-
-        return cls(
-            **data,
-            authors=authors,
-            series=series,
-            words=words,
-            finished=finished,
-            published=published,
-            fills=fills,
-            links=links,
-            attendant_va=attendant_va,
-        )
+        return decode(cls, data, strict_dates=strict_dates, links=links, fills=fills)
 
     @property
     def speakers(self) -> tuple[str, ...]:
@@ -197,16 +188,173 @@ class Script:
     @property
     def filled_by(self) -> set[str]:
         """Return a set of the VAs who have filled this script."""
-        creators: set[str] = set()
+        return set().union(*(f.creators for f in self.fills))
+
+
+@dataclass(slots=True)
+class SourceData:
+    scripts: list[Script]
+    audios: list[FillData]
+
+
+def decode_source(data: Mapping[str, Any], *, strict_dates: bool = False) -> SourceData:
+    """Decode the scripts and the audios from the raw data, as loaded from either the .json or the source .yaml file."""
+    dates, durations = parse_date.cache_info(), FillData.parse_duration.cache_info()
+
+    with instrumentation.stage("decode"):
+        source = SourceData(
+            scripts=[Script.from_dict(item, strict_dates=strict_dates) for item in data["scripts"]],
+            audios=[FillData.from_dict(item, strict_dates=strict_dates) for item in data["audios"]],
+        )
+
+    for name, before, after in (("parse_date", dates, parse_date.cache_info()),
+                                ("parse_duration", durations, FillData.parse_duration.cache_info())):
+        instrumentation.record_cache(name, hits=after.hits - before.hits, misses=after.misses - before.misses)
+
+    fills = [fill for script in source.scripts for fill in script.fills]
+    instrumentation.count("scripts", len(source.scripts))
+    instrumentation.count("fills", len(fills))
+    instrumentation.count("audios", len(source.audios))
+    instrumentation.count("links", sum(len(script.links.combine_dict()) for script in source.scripts)
+                          + sum(len(fill.links or ()) for fill in fills))
+
+    return source
+
+
+def load(filepath: Path, *, strict_dates: bool = False) -> SourceData:
+    """Read the data file once, decoding both the scripts and the audios."""
+    with instrumentation.stage("read_json"):
+        data = json.loads(filepath.read_bytes())
+
+    return decode_source(data, strict_dates=strict_dates)
 
-        for f in self.fills:
-            creators |= set(f.creators)
 
-        return creators
+def parse(filepath: Path, *, strict_dates: bool = False) -> list[Script]:
+    return load(filepath, strict_dates=strict_dates).scripts
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# schema-driven decoding
+#
+# Each model class is decoded according to its own field declarations: the field's type decides how the raw value is
+# converted (nested models, dates, durations), and its metadata may give the source key ("key"), a factory for the
+# value to use when that key is absent ("missing"), and whether its strings should be interned ("intern").
+#
+# Interning matters because the same tags, audience tags, VA names and link labels recur across thousands of scripts
+# and fills: each distinct string is then stored once, and set operations over them compare by identity.
+# ----------------------------------------------------------------------------------------------------------------------
+def intern_all(values: Iterable[str]) -> tuple[str, ...]:
+    """Return the given strings as a tuple of interned strings."""
+    return tuple(map(sys.intern, values))
+
+
+def _intern_keys[V](mapping: Mapping[str, V]) -> dict[str, V]:
+    return {sys.intern(key): value for key, value in mapping.items()}
+
+
+@dataclass(frozen=True)
+class _FieldSpec:
+    name: str
+    key: str
+    convert: Callable[[Any], Any] | None
+    missing: Callable[[], Any] | None
+    required: bool
+
+
+def _optional(convert: Callable[[Any], Any]) -> Callable[[Any], Any]:
+    return lambda value: None if value is None else convert(value)
+
+
+def _converter(hint: Any, strict_dates: bool, intern: bool = False) -> Callable[[Any], Any] | None:
+    """Return the function converting a raw value to the given type, or None if the raw value can be used as-is."""
+    origin = get_origin(hint)
+
+    if origin is Union or origin is types.UnionType:
+        args = [arg for arg in get_args(hint) if arg is not type(None)]
+        if len(args) != 1:
+            return None
+
+        convert = _converter(args[0], strict_dates, intern)
+        return None if convert is None else _optional(convert)
+
+    if origin is tuple:
+        return intern_all if intern else tuple
+
+    if origin is dict:
+        return _intern_keys if intern else None
+
+    if hint is str:
+        return sys.intern if intern else None
+
+    if origin is list:
+        (item,) = get_args(hint)
+        convert = _converter(item, strict_dates)
+        return None if convert is None else (lambda values: [convert(value) for value in values])
+
+    if hint is datetime:
+        return partial(parse_date, strict=strict_dates)
+
+    if hint is timedelta:
+        return FillData.parse_duration
+
+    if is_dataclass(hint):
+        return partial(decode, hint, strict_dates=strict_dates)
+
+    return None
+
+
+@lru_cache(maxsize=None)
+def _schema(cls: type, strict_dates: bool) -> tuple[tuple[_FieldSpec, ...], frozenset[str]]:
+    hints = get_type_hints(cls)
+    specs: list[_FieldSpec] = []
+
+    for f in fields(cls):
+        if not f.init:
+            continue
+
+        specs.append(_FieldSpec(
+            name=f.name,
+            key=f.metadata.get("key", f.name),
+            convert=_converter(hints[f.name], strict_dates, f.metadata.get("intern", False)),
+            missing=f.metadata.get("missing"),
+            required=f.default is MISSING and f.default_factory is MISSING,
+        ))
+
+    return tuple(specs), frozenset(spec.key for spec in specs)
+
+
+def decode[T](cls: type[T], data: Mapping[str, Any], *, strict_dates: bool = False, **overrides: Any) -> T:
+    """Decode a raw mapping (as loaded from the data or source file) into an instance of the given model class.
+
+    Any keyword overrides are used as field values directly, in place of decoding them from the data.
+    """
+    specs, keys = _schema(cls, strict_dates)
+
+    if unknown := data.keys() - keys:
+        raise TypeError(f"unexpected keys for {cls.__name__}: {sorted(unknown)}; context: {data}")
+
+    kwargs: dict[str, Any] = {}
+    for spec in specs:
+        if spec.name in overrides:
+            kwargs[spec.name] = overrides[spec.name]
+            continue
+
+        if spec.key in data:
+            value = data[spec.key]
+        elif spec.missing is not None:
+            value = spec.missing()
+        elif spec.required:
+            raise TypeError(f"missing key for {cls.__name__}: {spec.key!r}; context: {data}")
+        else:
+            # leave it to the dataclass default
+            continue
 
+        if spec.convert is not None:
+            try:
+                value = spec.convert(value)
+            except (TypeError, ValueError) as e:
+                raise ValueError(f"cannot decode {cls.__name__}.{spec.name} from {value!r}; context: {data}") from e
 
-def parse(filepath: Path) -> list[Script]:
-    with open(filepath, mode="r", encoding="utf-8") as f:
-        data = json.load(f)
+        kwargs[spec.name] = value
 
-    return [Script.from_dict(item) for item in data["scripts"]]
+    return cls(**kwargs)
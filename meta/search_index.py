@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+import re
+from collections import defaultdict
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from builder import EScriptData
+
+# Tokens are split on whitespace and ASCII punctuation only. script.js splits the filter text on exactly the same
+# characters, so that every word of the filter text is guaranteed to lie within a single indexed token.
+TOKEN_SEPARATORS = re.compile(r"[\s!-/:-@\[-`{-~]+")
+
+
+def searchable_text(script: EScriptData) -> str:
+    """Return the text the filter box matches against: the title, summary and tags, lowercased.
+
+    The fields are separated by newlines, which cannot be typed into the filter box, so no match can span two fields.
+    """
+    return "\n".join([script.title, script.summary, *script.content_tags]).lower()
+
+
+def make_search_index(scripts: list[EScriptData]) -> dict[str, Any]:
+    """Return the search index for the text filter on the index page.
+
+    Scripts are referred to by their position in the page. "tokens" maps each distinct token to the positions of the
+    scripts containing it, so script.js only has to scan the vocabulary (rather than every script) to find candidate
+    matches, before checking each candidate against its entry in "texts".
+    """
+    ids: list[str] = []
+    texts: list[str] = []
+    tokens: defaultdict[str, list[int]] = defaultdict(list)
+
+    for i, script in enumerate(scripts):
+        text = searchable_text(script)
+        ids.append(script.slug)
+        texts.append(text)
+
+        for token in set(TOKEN_SEPARATORS.split(text)):
+            if token:
+                tokens[token].append(i)
+
+    return {"ids": ids, "texts": texts, "tokens": dict(sorted(tokens.items()))}
@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+import pytest
+
+# the build scripts import each other as top-level modules, as they do when run from meta/
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import environment  # noqa: E402
+from environment import get_environment  # noqa: E402
+import outputs  # noqa: E402
+from outputs import BuildManifest  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def template_caches(tmp_path_factory, monkeypatch) -> tuple[Path, Path]:
+    """Keep the compiled templates and their bytecode out of the developer's build cache. Return the compiled template
+    and bytecode directories used instead."""
+    root = tmp_path_factory.mktemp("template-caches")
+    compiled, bytecode = root / "compiled", root / "bytecode"
+    monkeypatch.setattr(environment, "COMPILED_DIR", compiled)
+    monkeypatch.setattr(environment, "BYTECODE_DIR", bytecode)
+
+    get_environment.cache_clear()
+    yield compiled, bytecode
+    get_environment.cache_clear()
+
+
+@pytest.fixture(autouse=True)
+def build_manifest(tmp_path_factory, monkeypatch) -> BuildManifest:
+    """Keep the tests' outputs out of the developer's build manifest."""
+    manifest = BuildManifest(tmp_path_factory.mktemp("manifest") / "outputs.json")
+    monkeypatch.setattr(outputs, "_manifest", manifest)
+    return manifest
@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pytest
+
+from builder import BuildOptions, ScriptContext, build_index, load_scripts_and_audios
+import environment
+
+TEMPLATE_DIR = Path(__file__).parent.parent / "templates" / "index"
+
+
+@pytest.fixture(scope="module")
+def context() -> ScriptContext:
+    scripts, _ = load_scripts_and_audios()
+    return ScriptContext.from_scripts(scripts)
+
+
+def _pages(root: Path) -> dict[str, str]:
+    return {str(path.relative_to(root)): path.read_text(encoding="utf-8") for path in sorted(root.rglob("*.html"))}
+
+
+def _use_template_caches(compiled: Path, bytecode: Path) -> None:
+    # (the worker processes import environment afresh, so they have to be pointed at the tests' caches themselves)
+    environment.COMPILED_DIR = compiled
+    environment.BYTECODE_DIR = bytecode
+
+
+def test_parallel_precompiled_build_from_a_cold_cache(context, template_caches, tmp_path):
+    # the template caches start out empty, so that every worker process would need the compiled templates at once
+    options = BuildOptions(precompiled=True, jobs=4, shard_size=10)
+    with ProcessPoolExecutor(options.jobs, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=_use_template_caches, initargs=template_caches) as executor:
+        build_index(context, TEMPLATE_DIR, tmp_path / "parallel" / "index.html", options=options, executor=executor)
+
+    build_index(context, TEMPLATE_DIR, tmp_path / "serial" / "index.html", options=BuildOptions(shard_size=10))
+
+    parallel = _pages(tmp_path / "parallel")
+    assert len(parallel) > 2
+    assert parallel == _pages(tmp_path / "serial")
@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import os
+from pathlib import Path
+
+import pytest
+
+from builder import ScriptContext, iter_script_fragments, load_scripts_and_audios
+from cache import FragmentCache
+
+TEMPLATE_DIR = Path(__file__).parent.parent / "templates" / "index"
+
+
+@pytest.fixture(scope="module")
+def context() -> ScriptContext:
+    scripts, _ = load_scripts_and_audios()
+    return ScriptContext.from_scripts(scripts[:5])
+
+
+def test_put_and_get(tmp_path):
+    cache = FragmentCache(tmp_path, "salt")
+    key = cache.key("content")
+
+    assert key not in cache
+    assert cache.get(key) is None
+
+    cache.put(key, "<p>café</p>")
+    assert key in cache
+    assert cache.get(key) == "<p>café</p>"
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert [path.name for path in tmp_path.iterdir()] == [f"{key}.html"]
+
+
+def test_failed_put_leaves_nothing_behind(tmp_path, monkeypatch):
+    cache = FragmentCache(tmp_path, "salt")
+    key = cache.key("content")
+
+    def fail(src, dst):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(os, "replace", fail)
+    with pytest.raises(OSError):
+        cache.put(key, "<p>fragment</p>")
+
+    assert key not in cache
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_prune_removes_unused_fragments(tmp_path):
+    old = FragmentCache(tmp_path, "salt")
+    old.put(old.key("kept"), "kept")
+    old.put(old.key("dropped"), "dropped")
+
+    cache = FragmentCache(tmp_path, "salt")
+    assert cache.key("kept") in cache
+    assert cache.prune() == 1
+    assert [path.stem for path in tmp_path.iterdir()] == [cache.key("kept")]
+
+
+def test_fragments_removed_after_lookup_are_rendered(context, tmp_path):
+    expected = list(iter_script_fragments(context.scripts, TEMPLATE_DIR))
+
+    class PrunedCache(FragmentCache):
+        """Loses every fragment just after it is looked up, as if another build had pruned it."""
+
+        def __contains__(self, key: str) -> bool:
+            found = super().__contains__(key)
+            self._path(key).unlink(missing_ok=True)
+            return found
+
+    cache = PrunedCache(tmp_path, "salt")
+    list(iter_script_fragments(context.scripts, TEMPLATE_DIR, cache=cache))
+
+    assert list(iter_script_fragments(context.scripts, TEMPLATE_DIR, cache=cache)) == expected
@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import dataclasses
+from collections import Counter
+from pathlib import Path
+
+import pytest
+
+from builder import load_scripts_and_audios
+from catalog import Catalog
+from catalog_db import ONE_SHOTS_ONLY, ScriptFilters, count_scripts, export_catalog, open_catalog, query_scripts
+from custom_filters import any_nsfw
+
+
+@pytest.fixture(scope="module")
+def catalog() -> Catalog:
+    scripts, _ = load_scripts_and_audios()
+    return Catalog(scripts)
+
+
+@pytest.fixture(scope="module")
+def db(catalog, tmp_path_factory) -> Path:
+    path = tmp_path_factory.mktemp("catalog") / "catalog.sqlite3"
+    export_catalog(catalog, path)
+    return path
+
+
+def _positions(db: Path, filters: ScriptFilters, **kwargs) -> list[int]:
+    with open_catalog(db) as conn:
+        return [match.position for match in query_scripts(conn, filters, **kwargs)]
+
+
+def _most_common(index: dict) -> object:
+    return max(index, key=lambda key: len(index[key]))
+
+
+def test_default_filters_select_every_script(catalog, db):
+    assert _positions(db, ScriptFilters()) == list(range(len(catalog.scripts)))
+    assert _positions(db, ScriptFilters(), limit=5) == [0, 1, 2, 3, 4]
+
+    with open_catalog(db) as conn:
+        assert count_scripts(conn, ScriptFilters()) == (len(catalog.scripts), catalog.num_fills)
+
+
+def test_facet_filters(catalog, db):
+    va = _most_common(catalog.by_va)
+    tag = _most_common(catalog.by_audience)
+    speakers = _most_common(catalog.by_speakers)
+    series = _most_common(catalog.by_series)
+
+    assert _positions(db, ScriptFilters(filled_by=va)) == catalog.by_va[va]
+    assert _positions(db, ScriptFilters(audience=frozenset({tag}))) == catalog.by_audience[tag]
+    assert _positions(db, ScriptFilters(speakers=frozenset({speakers}))) == catalog.by_speakers[speakers]
+    assert _positions(db, ScriptFilters(series=series)) == catalog.by_series[series]
+    assert _positions(db, ScriptFilters(series=ONE_SHOTS_ONLY)) == [
+        i for i, script in enumerate(catalog.scripts) if script.series is None]
+
+
+def test_filters_are_combined(catalog, db):
+    tag = _most_common(catalog.by_audience)
+    filters = ScriptFilters(audience=frozenset({tag}), filled_status=frozenset({"unfilled"}),
+                            nsfw_status=frozenset({"SFW"}))
+
+    expected = [i for i in catalog.by_audience[tag]
+                if not catalog.scripts[i].fills and not any_nsfw(catalog.scripts[i].tags)]
+    assert _positions(db, filters) == expected
+
+
+def test_no_options_select_no_scripts(db):
+    assert _positions(db, ScriptFilters(filled_status=frozenset())) == []
+    assert _positions(db, ScriptFilters(audience=frozenset())) == []
+
+
+@pytest.mark.parametrize("length", [2, 5])
+def test_text_filter(catalog, db, length):
+    # a piece of the most common tag, so that it matches titles and summaries as well as tags
+    tag = Counter(tag.lower() for script in catalog.scripts for tag in script.tags).most_common(1)[0][0]
+    text = tag[:length]
+
+    expected = [i for i, script in enumerate(catalog.scripts)
+                if any(text in field.lower() for field in (script.title, script.summary, *script.tags))]
+    assert _positions(db, ScriptFilters(text=text.upper())) == expected
+
+
+def test_export_is_incremental(catalog, tmp_path):
+    path = tmp_path / "catalog.sqlite3"
+    assert str(export_catalog(catalog, path)) == f"{len(catalog.scripts)} added, 0 changed, 0 unchanged, 0 removed"
+
+    # the newest script is removed, and the next one's summary changes
+    scripts = catalog.scripts[1:]
+    scripts[0] = dataclasses.replace(scripts[0], summary="a new summary")
+    summary = export_catalog(Catalog(scripts), path)
+
+    assert (summary.added, summary.changed, summary.unchanged, summary.removed) == (0, 1, len(scripts) - 1, 1)
+    assert _positions(path, ScriptFilters()) == list(range(len(scripts)))
+    assert _positions(path, ScriptFilters(text="a new summary")) == [0]
@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from check_links import CheckOptions, ResultCache, check_links
+
+# (no rate limit, so that the tests don't wait on it)
+OPTIONS = CheckOptions(rate_per_host=0, timeout=0.5)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Answers each path as the links it stands for would be."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_HEAD(self):
+        self.respond(body=False)
+
+    def do_GET(self):
+        self.respond(body=True)
+
+    def respond(self, *, body: bool) -> None:
+        server: StubServer = self.server  # type: ignore[assignment]
+        with server.lock:
+            server.requests[self.command, self.path] += 1
+            server.connections.setdefault(self.path, set()).add(self.client_address)
+            count = server.requests[self.command, self.path]
+
+        match self.path:
+            case "/ok":
+                self.send(200)
+            case "/missing":
+                self.send(404)
+            case "/moved":
+                self.send(301, {"Location": "/ok"})
+            case "/no-head":
+                self.send(405 if self.command == "HEAD" else 200, body=body)
+            case "/slow":
+                time.sleep(1)
+                self.send(200)
+            case "/etag":
+                if self.headers.get("If-None-Match") == '"v1"':
+                    server.requests["304", self.path] += 1
+                    self.send(304, {"ETag": '"v1"'})
+                else:
+                    self.send(200, {"ETag": '"v1"'})
+            case "/throttled-once":
+                self.send(429, {"Retry-After": "1"}) if count == 1 else self.send(200)
+            case "/throttled":
+                self.send(429, {"Retry-After": "0"})
+            case "/unavailable":
+                self.send(503)
+            case _:
+                self.send(404)
+
+    def send(self, status: int, headers: dict[str, str] | None = None, *, body: bool = False) -> None:
+        content = b"" if status == 304 else f"{status}\n".encode()
+
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if status != 304:
+            self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+
+        if body:
+            self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.lock = threading.Lock()
+        self.requests: Counter[tuple[str, str]] = Counter()
+        self.connections: dict[str, set[tuple[str, int]]] = {}
+
+    def url(self, path: str) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}{path}"
+
+
+@pytest.fixture
+def server():
+    server = StubServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_statuses(server):
+    results = check_links([server.url("/ok"), server.url("/missing")], options=OPTIONS)
+
+    assert [(result.status, result.ok) for result in results.values()] == [(200, True), (404, False)]
+
+
+def test_redirects_are_followed(server):
+    result = check_links([server.url("/moved")], options=OPTIONS)[server.url("/moved")]
+
+    assert (result.status, result.final_url) == (200, server.url("/ok"))
+
+
+def test_head_refused_is_retried_with_get(server):
+    result = check_links([server.url("/no-head")], options=OPTIONS)[server.url("/no-head")]
+
+    assert result.status == 200
+    assert server.requests["HEAD", "/no-head"] == server.requests["GET", "/no-head"] == 1
+
+
+def test_timeout(server):
+    result = check_links([server.url("/slow")], options=OPTIONS)[server.url("/slow")]
+
+    assert result.status is None and not result.ok
+
+
+def test_revalidation_with_etag(server, tmp_path):
+    # (results are never fresh, so every run revalidates them)
+    options = CheckOptions(rate_per_host=0, timeout=0.5, ttl=0, connections_per_host=1)
+    urls = [server.url("/etag"), server.url("/ok")]
+
+    cache = ResultCache(tmp_path / "links.json", options.ttl)
+    first = check_links(urls, options=options, cache=cache)
+    server.connections.clear()
+    second = check_links(urls, options=options, cache=cache)
+
+    assert first[urls[0]].etag == second[urls[0]].etag == '"v1"'
+    assert second[urls[0]].ok and second[urls[0]].checked > first[urls[0]].checked
+    assert server.requests["304", "/etag"] == 1
+    # the bodiless 304 leaves the connection open for the next request
+    assert server.connections["/etag"] == server.connections["/ok"]
+
+
+def test_throttled_requests_are_retried(server):
+    start = time.perf_counter()
+    result = check_links([server.url("/throttled-once")], options=OPTIONS)[server.url("/throttled-once")]
+
+    assert result.status == 200
+    # (after as long as the Retry-After asked for)
+    assert time.perf_counter() - start >= 1
+    assert server.requests["HEAD", "/throttled-once"] == 2
+
+
+def test_throttled_links_are_inconclusive(server, tmp_path):
+    cache = ResultCache(tmp_path / "links.json", OPTIONS.ttl)
+    results = check_links([server.url("/throttled"), server.url("/unavailable")], options=OPTIONS, cache=cache)
+    throttled, unavailable = results.values()
+
+    assert throttled.throttled and not throttled.broken
+    assert cache.get(server.url("/throttled")) is None
+    # a 503 without a Retry-After is just a broken link
+    assert unavailable.broken and not unavailable.throttled
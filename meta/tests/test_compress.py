@@ -0,0 +1,37 @@
+from __future__ import annotations
+
+import gzip
+
+import pytest
+
+import compress
+from compress import ENCODERS, precompress, remove_stale_siblings
+
+
+@pytest.fixture
+def site(tmp_path, monkeypatch):
+    monkeypatch.setattr(compress, "MANIFEST", tmp_path / "compressed.json")
+    site = tmp_path / "site"
+    site.mkdir()
+    for name in ("index.html", "all-fills.html", "search.json"):
+        (site / name).write_text(f"<p>{name}</p>")
+    return site
+
+
+def test_precompress(site):
+    precompress([site], jobs=2)
+
+    for name in ("index.html", "all-fills.html", "search.json"):
+        assert gzip.decompress((site / f"{name}.gz").read_bytes()) == (site / name).read_bytes()
+
+
+def test_stale_siblings_are_removed_without_precompress(site):
+    precompress([site])
+    (site / "index.html").write_text("<p>the new index</p>")
+    (site / "search.json").unlink()
+
+    remove_stale_siblings([site])
+
+    # only the unchanged page keeps its siblings
+    assert {path.name for path in site.iterdir()} == {"index.html", "all-fills.html",
+                                                      *(f"all-fills.html{suffix}" for suffix in ENCODERS)}
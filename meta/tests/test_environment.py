@@ -0,0 +1,37 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import jinja2
+
+import environment
+from cache import digest_files
+
+TEMPLATE_DIR = Path(__file__).parent.parent / "templates" / "fills"
+
+
+def test_precompile_templates(monkeypatch, tmp_path):
+    monkeypatch.setattr(environment, "COMPILED_DIR", tmp_path)
+
+    target = environment.precompile_templates(TEMPLATE_DIR)
+
+    assert target == tmp_path / digest_files(TEMPLATE_DIR.glob("*.html"))
+    assert {path.name for path in tmp_path.iterdir()} == {target.name}
+    assert environment.precompile_templates(TEMPLATE_DIR) == target
+
+
+def test_precompile_templates_when_another_process_finishes_first(monkeypatch, tmp_path):
+    monkeypatch.setattr(environment, "COMPILED_DIR", tmp_path)
+    winner = tmp_path / digest_files(TEMPLATE_DIR.glob("*.html"))
+    compile_templates = jinja2.Environment.compile_templates
+
+    def compile_and_lose_the_race(self, target, **kwargs):
+        compile_templates(self, target, **kwargs)
+        compile_templates(self, str(winner), **kwargs)
+
+    monkeypatch.setattr(jinja2.Environment, "compile_templates", compile_and_lose_the_race)
+
+    assert environment.precompile_templates(TEMPLATE_DIR) == winner
+    # the scratch directory is cleaned up, and the winner's templates load
+    assert {path.name for path in tmp_path.iterdir()} == {winner.name}
+    assert jinja2.Environment(loader=jinja2.ModuleLoader(str(winner))).get_template("fill.html")
@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import re
+from html.parser import HTMLParser
+from pathlib import Path
+
+from markupsafe import Markup
+
+from builder import ViewModels, iter_script_fragments, load_scripts_and_audios, render_index
+from minify import HtmlMinifier, minify, minify_stream
+
+TEMPLATE_DIR = Path(__file__).parent.parent / "templates" / "index"
+
+
+class _Dom(HTMLParser):
+    """The events of a parsed page, with comments dropped and each run of text's whitespace collapsed, which is all
+    that minification may change."""
+
+    def __init__(self, html: str) -> None:
+        super().__init__(convert_charrefs=True)
+        self.events: list[tuple] = []
+        self._text: list[str] = []
+        self.feed(html)
+        self.close()
+        self._flush()
+
+    def _flush(self) -> None:
+        text = re.sub(r"[ \t\n\r\f]+", " ", "".join(self._text))
+        if text.strip():
+            self.events.append(("text", text))
+        self._text = []
+
+    def handle_starttag(self, tag, attrs):
+        self._flush()
+        self.events.append(("start", tag, tuple(attrs)))
+
+    def handle_endtag(self, tag):
+        self._flush()
+        self.events.append(("end", tag))
+
+    def handle_data(self, data):
+        self._text.append(data)
+
+
+def test_collapses_whitespace_and_drops_comments():
+    assert minify("<p>\n  a   <!-- note -->  b\n</p>\n") == "<p>\na b\n</p>\n"
+    assert minify('<div  class="x  y"\n  id="z" >') == '<div class="x  y" id="z">'
+
+
+def test_keeps_raw_elements():
+    html = "<pre>  a\n\n  b</pre> <script>if (a  <  b) {}</script>"
+    assert minify(html) == html
+
+
+def test_tags_split_across_chunks():
+    minifier = HtmlMinifier()
+    out = minifier.feed("<p>a <b") + minifier.feed(' class="x">b</b') + minifier.feed("></p>") + minifier.close()
+    assert out == '<p>a <b class="x">b</b></p>'
+
+
+def test_markup_chunks_are_not_escaped():
+    minifier = HtmlMinifier()
+    out = minifier.feed("<p>a <b") + minifier.feed(Markup("72")) + minifier.feed("></b></p>") + minifier.close()
+    assert out == "<p>a <b72></b></p>"
+
+
+def test_minified_index_parses_to_the_same_page():
+    scripts, _ = load_scripts_and_audios()
+    context = ViewModels.from_scripts(scripts).context
+
+    def page():
+        fragments = iter_script_fragments(context.scripts, TEMPLATE_DIR)
+        return render_index(context, TEMPLATE_DIR, fragments, chunks=[], search_index="search.json",
+                            facet_index="facets.json")
+
+    html = "".join(page())
+    minified = "".join(minify_stream(page()))
+
+    assert len(minified) < len(html)
+    assert _Dom(minified).events == _Dom(html).events
@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import json
+
+import pytest
+
+import outputs
+from outputs import BuildManifest, file_digest, recording_outputs, remove_output, write_text
+
+
+@pytest.fixture
+def manifest(tmp_path, monkeypatch) -> BuildManifest:
+    manifest = BuildManifest(tmp_path / "outputs.json")
+    monkeypatch.setattr(outputs, "_manifest", manifest)
+    return manifest
+
+
+def _saved(manifest: BuildManifest) -> dict:
+    return json.loads(manifest.path.read_text(encoding="utf-8"))
+
+
+def test_outputs_are_saved_once_per_build(manifest, tmp_path, monkeypatch):
+    saves = []
+    save = BuildManifest.save
+    monkeypatch.setattr(BuildManifest, "save", lambda self: (saves.append(self._dirty), save(self)))
+
+    with recording_outputs():
+        for i in range(10):
+            write_text(f"page {i}", tmp_path / f"{i}.html")
+
+        assert not manifest.path.exists()
+
+    assert saves == [True]
+    assert set(_saved(manifest)) == {str((tmp_path / f"{i}.html").resolve()) for i in range(10)}
+
+
+def test_unchanged_outputs_leave_the_manifest_alone(manifest, tmp_path):
+    page = tmp_path / "page.html"
+    with recording_outputs():
+        write_text("page", page)
+
+    saved = manifest.path.stat().st_mtime_ns
+    with recording_outputs():
+        write_text("page", page)
+
+    assert manifest.path.stat().st_mtime_ns == saved
+    assert not manifest._dirty
+
+
+def test_changed_and_removed_outputs_are_saved(manifest, tmp_path):
+    page, other = tmp_path / "page.html", tmp_path / "other.html"
+    with recording_outputs():
+        write_text("page", page)
+        write_text("other", other)
+
+    with recording_outputs():
+        write_text("new page", page)
+        remove_output(other)
+
+    assert _saved(manifest) == {str(page.resolve()): {"sha256": file_digest(page), "size": page.stat().st_size,
+                                                      "mtime_ns": page.stat().st_mtime_ns}}
+    assert BuildManifest(manifest.path).status(page, file_digest(page)) == "unchanged"
+
+
+def test_manifest_is_saved_when_the_build_fails(manifest, tmp_path):
+    with pytest.raises(RuntimeError), recording_outputs():
+        write_text("page", tmp_path / "page.html")
+        raise RuntimeError("the build failed")
+
+    assert str((tmp_path / "page.html").resolve()) in _saved(manifest)
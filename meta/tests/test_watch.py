@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import environment
+import watch
+from environment import get_environment
+
+
+def test_template_changes_are_rendered_with_precompile(monkeypatch, tmp_path):
+    monkeypatch.setattr(environment, "COMPILED_DIR", tmp_path / "compiled")
+    monkeypatch.setattr(watch, "TEMPLATE_ROOT", tmp_path / "templates")
+    template_dir = tmp_path / "templates" / "index"
+    template_dir.mkdir(parents=True)
+    template = template_dir / "page.html"
+
+    template.write_text("before")
+    assert get_environment(template_dir, precompiled=True).get_template("page.html").render() == "before"
+
+    template.write_text("after")
+    watch.forget_templates({template})
+    assert get_environment(template_dir, precompiled=True).get_template("page.html").render() == "after"
+
+
+def test_other_changes_keep_the_environments(monkeypatch, tmp_path):
+    monkeypatch.setattr(watch, "TEMPLATE_ROOT", tmp_path / "templates")
+    env = get_environment(tmp_path, precompiled=False)
+
+    watch.forget_templates({tmp_path / "script-data.json"})
+    assert get_environment(tmp_path, precompiled=False) is env
+
+
+def test_sources_saved_during_a_build_are_rebuilt(tmp_path):
+    source, output = tmp_path / "source.yaml", tmp_path / "script-data.json"
+    source.write_text("before")
+    before = watch.take_snapshot([tmp_path])
+
+    # the build writes its output, and the source is saved again meanwhile
+    output.write_text("built")
+    source.write_text("after the build started")
+    after = watch.take_snapshot([tmp_path])
+
+    snapshot = watch.snapshot_after_build(before, after, [output])
+    assert watch.changed_files(snapshot, after) == {source}
+
+
+def test_outputs_removed_by_a_build_are_not_changes(tmp_path):
+    output = tmp_path / "script-data.json"
+    output.write_text("stale")
+    before = watch.take_snapshot([tmp_path])
+
+    output.unlink()
+    after = watch.take_snapshot([tmp_path])
+
+    assert watch.changed_files(watch.snapshot_after_build(before, after, [output]), after) == set()
@@ -1,50 +1,233 @@
+import hashlib
 import json
+import pickle
 from argparse import ArgumentParser
 from collections.abc import Iterable, Mapping
+from contextlib import ExitStack
+from datetime import date
 from pathlib import Path
-from typing import Any
+from typing import IO, Any
 
 import yaml
 
+import instrumentation
+from cache import CACHE_DIR, digest_text
+from outputs import atomic_writer, recording_outputs, write_bytes
 
-def load_data(datafile: Path) -> dict[str, Any]:
-    with open(datafile, "r", encoding="utf-8") as f:
-        data: dict[str, list[dict[str, Any]]] = yaml.safe_load(f)
+try:
+    # libyaml's parser is many times faster than the pure-Python one
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
 
-    scripts: list[dict[str, Any]] = []
 
-    for script in data["scripts"]:
-        if script.get("published") is not None:
-            script["published"] = script["published"].strftime("%Y-%m-%d")
+# fill keys which are only kept in the source file, and never written out
+PRIVATE_FILL_KEYS = ("credited", "informed", "notes")
+
+# the format of the dates in the .json file
+DATE_FORMAT = "%Y-%m-%d"
+
+# the formats the .json files can be written in: "pretty" (the committed data file's format, exactly as json.dump with
+# indent=4 writes it), "compact" (the same JSON without whitespace), or "ndjson" (one record per line, each wrapped as
+# {"script": ...} or {"audio": ...}, for machine consumers which stream it)
+JSON_MODES = ("pretty", "compact", "ndjson")
+
+# parsed source files are cached here, one per source file
+SOURCE_CACHE_DIR = CACHE_DIR / "source"
 
-        if dt := script.get("finished"):
-            script["finished"] = dt.strftime("%Y-%m-%d")
+# bump this whenever the structure returned by read_source changes, so that existing cache entries are ignored
+SOURCE_CACHE_VERSION = "1"
 
-        # remove credited, informed, and notes keys from fills
-        keys_to_remove = ("credited", "informed", "notes")
 
+def parse_source(text: str) -> dict[str, list[dict[str, Any]]]:
+    """Parse the source .yaml text, removing the private keys from fills. Dates are left as date objects."""
+    data: dict[str, list[dict[str, Any]]] = yaml.load(text, Loader=SafeLoader)
+
+    for script in data["scripts"]:
         fill: dict[str, Any]
         for fill in script.get("fills", []):
-            for key in keys_to_remove:
+            for key in PRIVATE_FILL_KEYS:
                 fill.pop(key, None)
 
-            if dt := fill.get("date"):
-                fill["date"] = dt.strftime("%Y-%m-%d")
+    return {"scripts": data["scripts"], "audios": data["audios"]}
+
+
+def read_source(datafile: Path, *, use_cache: bool = True) -> tuple[dict[str, list[dict[str, Any]]], str]:
+    """Read the source .yaml file (see parse_source), returning its data along with a description of how it was read.
+
+    The parsed data is pickled to a cache keyed on the file's content hash, so an unchanged source is never parsed
+    twice.
+    """
+    with instrumentation.stage("read_source"):
+        raw = datafile.read_bytes()
+        if not use_cache:
+            return parse_source(raw.decode("utf-8")), f"parsed with {SafeLoader.__name__}"
+
+        key = digest_text(SOURCE_CACHE_VERSION, SafeLoader.__name__, hashlib.sha256(raw).hexdigest())
+        cache_file = SOURCE_CACHE_DIR / f"{digest_text(str(datafile.resolve()))}.pickle"
+
+        try:
+            cached_key, data = pickle.loads(cache_file.read_bytes())
+            if cached_key == key:
+                instrumentation.record_cache("source", hits=1)
+                return data, f"loaded from cache {cache_file}"
+        except Exception:
+            # a missing or unreadable cache file is simply (re)written
+            pass
+
+        instrumentation.record_cache("source", misses=1)
+        data = parse_source(raw.decode("utf-8"))
+
+        SOURCE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        write_bytes(pickle.dumps((key, data), protocol=pickle.HIGHEST_PROTOCOL), cache_file, tracked=False)
+
+    return data, f"parsed with {SafeLoader.__name__}, cached to {cache_file}"
 
-        scripts.append(script)
-    
-    audios: list[dict[str, Any]] = []
-    for audio in data["audios"]:
-        if audio.get("date") is not None:
-            audio["date"] = audio["date"].strftime("%Y-%m-%d")
-        audios.append(audio)
 
+def _with_formatted_dates(item: Mapping[str, Any], keys: Iterable[str]) -> dict[str, Any]:
+    # (dates which have already been formatted are left as they are)
+    return {key: value.strftime(DATE_FORMAT) if key in keys and isinstance(value, date) else value
+            for key, value in item.items()}
+
+
+def _formatted_script(script: Mapping[str, Any]) -> dict[str, Any]:
+    formatted = _with_formatted_dates(script, ("published", "finished"))
+    if "fills" in formatted:
+        formatted["fills"] = [_with_formatted_dates(fill, ("date",)) for fill in formatted["fills"]]
+
+    return formatted
+
+
+def format_dates(data: Mapping[str, list[dict[str, Any]]]) -> dict[str, list[dict[str, Any]]]:
+    """Return a copy of the source data with its dates written as strings, as they are stored in the .json file."""
+    scripts = [_formatted_script(script) for script in data["scripts"]]
+    audios = [_with_formatted_dates(audio, ("date",)) for audio in data["audios"]]
 
     return {"scripts": scripts, "audios": audios}
 
 
-def remove_unpublished(data: Iterable[Mapping[str, Any]]) -> list[dict[str, Any]]:
-    return [dict(x) for x in data if x.get("published") is not None]
+def load_data(datafile: Path, *, use_cache: bool = True) -> dict[str, Any]:
+    data, _ = read_source(datafile, use_cache=use_cache)
+    return format_dates(data)
+
+
+def is_published(item: Mapping[str, Any]) -> bool:
+    return item.get("published") is not None
+
+
+def remove_unpublished(data: Iterable[Mapping[str, Any]]) -> list[Mapping[str, Any]]:
+    return [x for x in data if is_published(x)]
+
+
+class JsonExport:
+    """Writes the data's records to an open file one at a time, as they are given, in one of the JSON_MODES.
+
+    Each record is given already encoded (see encode_record), so the same text can be written to several exports.
+    """
+
+    def __init__(self, f: IO[str], mode: str) -> None:
+        self.f = f
+        self.mode = mode
+        self._lists = 0
+        self._items = 0
+
+        if mode != "ndjson":
+            f.write("{")
+
+    def begin_list(self, key: str) -> None:
+        """Start the list of records under the given key (e.g., "scripts")."""
+        self._items = 0
+        if self.mode == "pretty":
+            self.f.write(f"{',' if self._lists else ''}\n    {json.dumps(key)}: [")
+        elif self.mode == "compact":
+            self.f.write(f"{',' if self._lists else ''}{json.dumps(key)}:[")
+
+        self._lists += 1
+
+    def write(self, encoded: str) -> None:
+        """Add the next (encoded) record to the current list."""
+        if self.mode == "ndjson":
+            self.f.write(f"{encoded}\n")
+        else:
+            self.f.write(f"{',' if self._items else ''}{encoded}")
+
+        self._items += 1
+
+    def end_list(self) -> None:
+        if self.mode == "pretty":
+            self.f.write("\n    ]" if self._items else "]")
+        elif self.mode == "compact":
+            self.f.write("]")
+
+    def close(self) -> None:
+        if self.mode == "pretty":
+            self.f.write("\n}")
+        elif self.mode == "compact":
+            self.f.write("}")
+
+
+def encode_record(record: Mapping[str, Any], kind: str, mode: str) -> str:
+    """Encode a single record (of the given kind, e.g. "script") as it appears in an export of the given mode."""
+    if mode == "pretty":
+        # as nested within its list: JSON strings cannot contain raw newlines, so every line can just be indented
+        return "\n        " + json.dumps(record, indent=4).replace("\n", "\n        ")
+
+    if mode == "compact":
+        return json.dumps(record, separators=(",", ":"))
+
+    return json.dumps({kind: record}, separators=(",", ":"))
+
+
+def dump_json(data: Mapping[str, Any], out_file: Path, private_file: Path | None = None, *,
+              mode: str = "pretty", tracked: bool = True) -> None:
+    """Write the public .json file (published scripts only) and the private one from the given source data, whose
+    dates may either be date objects or already formatted.
+
+    Both files are written in a single pass over the records: each record is formatted and encoded once, then written
+    to the private file and (if it is published) to the public one, so only one record is ever copied at a time.
+    Unless tracked is unset (e.g., for scratch outputs), either file is left untouched if its content has not
+    changed.
+    """
+    if mode not in JSON_MODES:
+        raise ValueError(f"unknown JSON mode: {mode!r}")
+
+    if private_file is None:
+        private_file = out_file.with_stem(f"{out_file.stem}-private")
+
+    with instrumentation.stage("write_json"), recording_outputs(), ExitStack() as stack:
+        public = JsonExport(stack.enter_context(atomic_writer(out_file, tracked=tracked)), mode)
+        private = JsonExport(stack.enter_context(atomic_writer(private_file, tracked=tracked)), mode)
+        exports = (public, private)
+
+        for export in exports:
+            export.begin_list("scripts")
+
+        for script in data["scripts"]:
+            encoded = encode_record(_formatted_script(script), "script", mode)
+            private.write(encoded)
+            if is_published(script):
+                public.write(encoded)
+
+        for export in exports:
+            export.end_list()
+            export.begin_list("audios")
+
+        for audio in data["audios"]:
+            encoded = encode_record(_with_formatted_dates(audio, ("date",)), "audio", mode)
+            for export in exports:
+                export.write(encoded)
+
+        for export in exports:
+            export.end_list()
+            export.close()
+
+
+def write_json(in_file: Path, out_file: Path, private_file: Path | None = None, *, mode: str = "pretty") -> None:
+    """Convert the source .yaml file to the public .json file (published scripts only) and the private one."""
+    data, how = read_source(in_file)
+    print(f"{in_file}: {how}")
+
+    dump_json(data, out_file, private_file, mode=mode)
 
 
 def main():
@@ -52,24 +235,13 @@ def main():
     parser.add_argument("-i", "-y", "--in-file", type=Path, help="the source .yaml file to read", required=True)
     parser.add_argument("-o", "--out-file", type=Path, help="the output .json file", required=True)
     parser.add_argument("-p", "--private", type=Path, help="the output path for the private .json file")
+    parser.add_argument("--mode", choices=JSON_MODES, default="pretty",
+                        help="pretty-print the .json files (the default), write them compactly, or write them as "
+                             "NDJSON (one record per line)")
     args = parser.parse_args()
 
-    # read the source data
-    all_data = load_data(args.in_file)
-    public_data = {
-        "scripts": remove_unpublished(all_data["scripts"]),
-        "audios": all_data["audios"]
-    }
-
-    # output the data to file
-    with open(args.out_file, "w", encoding="utf-8") as f:
-        json.dump(public_data, f, indent=4)
-
-    if args.private is None:
-        args.private = args.out_file.with_stem(f"{args.out_file.stem}-private")
-
-    with open(args.private, "w", encoding="utf-8") as f:
-        json.dump(all_data, f, indent=4)
+    write_json(args.in_file, args.out_file, args.private, mode=args.mode)
+    print(f"outputs: {instrumentation.outputs_summary()}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,334 @@
+from __future__ import annotations
+
+import threading
+import time
+import traceback
+from argparse import ArgumentParser
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import instrumentation
+from build import decode_published
+from builder import (BuildOptions, EFillData, ViewModels, build_all_fills, build_index, load_scripts_and_audios,
+                     prepare_scripts_and_audios, site_directories)
+from catalog_db import CATALOG_DB, export_catalog
+from compress import remove_stale_siblings
+from environment import get_environment
+from outputs import recording_outputs
+from parser import Script
+from update_json import dump_json, read_source
+
+ROOT = Path(__file__).parent.parent
+META_DIR = ROOT / "meta"
+TEMPLATE_ROOT = META_DIR / "templates"
+DATA_FILE = ROOT / "script-data.json"
+
+# the build stages, in the order they have to run
+STAGES = ("json", "index", "all-fills")
+
+# how often the sources are checked for changes, in seconds
+POLL_INTERVAL = 0.1
+
+# browsers are told to reload through a stream of server-sent events from this path
+RELOAD_PATH = "/__reload"
+
+# injected into every page served, just before </body>
+RELOAD_SCRIPT = f"""<script>new EventSource("{RELOAD_PATH}").onmessage = () => location.reload();</script>"""
+
+
+type Snapshot = dict[Path, tuple[int, int]]
+
+
+def dependency_graph(source: Path | None) -> list[tuple[Path, frozenset[str]]]:
+    """Return the watched paths, each with the build stages that have to rerun when something under it changes.
+    Paths with no stages (e.g., the static files) only need the browser to reload."""
+    graph = [
+        (DATA_FILE, frozenset({"index", "all-fills"})),
+        (TEMPLATE_ROOT / "index", frozenset({"index"})),
+        (TEMPLATE_ROOT / "fills", frozenset({"all-fills"})),
+        (ROOT / "static", frozenset()),
+    ]
+
+    if source is not None:
+        graph.insert(0, (source, frozenset(STAGES)))
+
+    return graph
+
+
+def take_snapshot(paths: list[Path]) -> Snapshot:
+    """Return the modification time and size of every file at or under the given paths."""
+    snapshot: Snapshot = {}
+
+    for path in paths:
+        files = path.rglob("*") if path.is_dir() else [path]
+        for file in files:
+            try:
+                st = file.stat()
+            except FileNotFoundError:
+                continue
+
+            if not file.is_dir():
+                snapshot[file] = (st.st_mtime_ns, st.st_size)
+
+    return snapshot
+
+
+def changed_files(before: Snapshot, after: Snapshot) -> set[Path]:
+    """Return the files which were added, removed or modified between the two snapshots."""
+    return {path for path in before.keys() | after.keys() if before.get(path) != after.get(path)}
+
+
+def affected_stages(changes: set[Path], graph: list[tuple[Path, frozenset[str]]]) -> set[str]:
+    """Return the build stages which depend on any of the changed files."""
+    stages: set[str] = set()
+
+    for path in changes:
+        for root, dependents in graph:
+            if path == root or path.is_relative_to(root):
+                stages |= dependents
+
+    return stages
+
+
+def snapshot_after_build(before: Snapshot, after: Snapshot, written: Iterable[Path]) -> Snapshot:
+    """Return the snapshot to look for the next changes against, given those from before and after a build which wrote
+    the given outputs. The outputs are taken as the build left them, since they are not changes to react to, but
+    everything else as it was before the build, so that any source saved while it ran is rebuilt next."""
+    snapshot = dict(before)
+
+    for path in written:
+        if path in after:
+            snapshot[path] = after[path]
+        else:
+            snapshot.pop(path, None)
+
+    return snapshot
+
+
+def forget_templates(changes: set[Path]) -> None:
+    """Drop the cached template environments if any template has changed. (With --precompile, each environment loads
+    the templates as they were compiled when it was created, so it would keep rendering them as they were.)"""
+    if any(path.is_relative_to(TEMPLATE_ROOT) for path in changes):
+        get_environment.cache_clear()
+
+
+class ReloadNotifier:
+    """Tells every connected browser to reload whenever the site has been rebuilt."""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._version = 0
+
+    def notify(self) -> None:
+        with self._condition:
+            self._version += 1
+            self._condition.notify_all()
+
+    def wait(self, version: int, timeout: float) -> int:
+        """Wait for the site to change from the given version, returning the (possibly unchanged) current version."""
+        with self._condition:
+            self._condition.wait_for(lambda: self._version != version, timeout=timeout)
+            return self._version
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+
+class DevRequestHandler(SimpleHTTPRequestHandler):
+    """Serves the site, injecting the live-reload script into its pages, and streams reload events to browsers."""
+
+    # how often an idle event stream is written to, so that closed connections are noticed
+    KEEPALIVE_INTERVAL = 15
+
+    def __init__(self, *args, notifier: ReloadNotifier, **kwargs):
+        self.notifier = notifier
+        super().__init__(*args, **kwargs)
+
+    def do_GET(self):
+        if self.path == RELOAD_PATH:
+            self.send_reload_events()
+            return
+
+        path = Path(self.translate_path(self.path))
+        if path.is_dir():
+            path = path / "index.html"
+
+        if path.suffix == ".html" and path.is_file():
+            self.send_page(path)
+            return
+
+        super().do_GET()
+
+    def end_headers(self):
+        # never let the browser serve a stale copy after a reload
+        self.send_header("Cache-Control", "no-store")
+        super().end_headers()
+
+    def send_page(self, path: Path) -> None:
+        html = path.read_bytes()
+        head, body, tail = html.rpartition(b"</body>")
+        if body:
+            html = head + RELOAD_SCRIPT.encode("utf-8") + body + tail
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(html)))
+        self.end_headers()
+        self.wfile.write(html)
+
+    def send_reload_events(self) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+
+        version = self.notifier.version
+        try:
+            while True:
+                current = self.notifier.wait(version, timeout=self.KEEPALIVE_INTERVAL)
+                self.wfile.write(b"data: reload\n\n" if current != version else b": keepalive\n\n")
+                self.wfile.flush()
+                version = current
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, format, *args):
+        # requests are too frequent to be worth logging; errors are still reported via log_error
+        pass
+
+    def log_error(self, format, *args):
+        super().log_message(format, *args)
+
+
+@dataclass
+class Site:
+    """The state kept between rebuilds: the options to build with, and the most recently loaded data and the view
+    models built from it."""
+    source: Path | None
+    options: BuildOptions
+    strict_dates: bool = False
+    scripts: list[Script] | None = field(default=None, repr=False)
+    audios: list[EFillData] | None = field(default=None, repr=False)
+    views: ViewModels | None = field(default=None, repr=False)
+
+    def load(self) -> ViewModels:
+        if self.scripts is None:
+            self.scripts, self.audios = load_scripts_and_audios(strict_dates=self.strict_dates)
+            self.views = None
+
+        if self.views is None:
+            self.views = ViewModels.from_scripts(self.scripts)
+
+        return self.views
+
+    def run(self, stages: set[str]) -> None:
+        """Run the given build stages, in order."""
+        with recording_outputs():
+            if "json" in stages and self.source is not None:
+                # the pages are built from the source as read here, rather than from the .json file written from it
+                source, how = read_source(self.source)
+                print(f"{self.source}: {how}")
+                self.scripts, self.audios = prepare_scripts_and_audios(
+                    decode_published(source, strict_dates=self.strict_dates))
+                self.views = None
+                dump_json(source, DATA_FILE)
+
+            if "index" in stages and self.options.catalog_db is not None:
+                print(f"{self.options.catalog_db}: {export_catalog(self.load().catalog, self.options.catalog_db)}")
+
+            if "index" in stages:
+                build_index(self.load().context, template_dir=TEMPLATE_ROOT / "index", output_file=ROOT / "index.html",
+                            options=self.options)
+
+            if "all-fills" in stages:
+                build_all_fills(self.load().fills, template_dir=TEMPLATE_ROOT / "fills",
+                                output_file=ROOT / "all-fills.html", options=self.options)
+
+            # the pages are not precompressed while watching, so their compressed siblings would be stale
+            remove_stale_siblings(site_directories(ROOT))
+
+
+def watch(site: Site, notifier: ReloadNotifier, *, interval: float = POLL_INTERVAL) -> None:
+    """Rebuild whatever depends on each change to the sources, then tell the browsers to reload, until interrupted."""
+    graph = dependency_graph(site.source)
+    watched = [path for path, _ in graph]
+    snapshot = take_snapshot(watched)
+
+    while True:
+        time.sleep(interval)
+
+        current = take_snapshot(watched)
+        changes = changed_files(snapshot, current)
+        if not changes:
+            continue
+
+        stages = affected_stages(changes, graph)
+        forget_templates(changes)
+        if DATA_FILE in changes:
+            # the data has changed, so it has to be read again
+            site.scripts = site.audios = site.views = None
+
+        instrumentation.reset()
+        start = time.perf_counter()
+        try:
+            site.run(stages)
+        except Exception:
+            traceback.print_exc()
+            print("build failed; waiting for the next change")
+        else:
+            built = ", ".join(stage for stage in STAGES if stage in stages) or "static files"
+            print(f"{built} ({time.perf_counter() - start:.2f}s; outputs: {instrumentation.outputs_summary()})")
+            notifier.notify()
+
+        # outputs written by the build itself (e.g., the .json file) are not changes to react to
+        written = [Path(path) for paths in instrumentation.outputs().values() for path in paths]
+        snapshot = snapshot_after_build(current, take_snapshot(watched), written)
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("-i", "-y", "--in-file", type=Path,
+                        help=f"the source .yaml file to watch (otherwise, {DATA_FILE.name} is watched directly)")
+    parser.add_argument("--host", default="localhost", help="the address to serve the site on")
+    parser.add_argument("--port", type=int, default=8000, help="the port to serve the site on")
+    parser.add_argument("--precompile", action="store_true",
+                        help="render from templates precompiled to Python modules (compiling them if out of date)")
+    parser.add_argument("--shard-size", type=int, metavar="N",
+                        help="inline only the first N scripts in index.html, and load the rest in chunks of N")
+    parser.add_argument("--strict-dates", action="store_true", help="reject any date which is not in ISO format")
+    parser.add_argument("--catalog-db", type=Path, nargs="?", const=CATALOG_DB, metavar="PATH",
+                        help="also keep a SQLite export of the catalog up to date (by default, in the build cache)")
+    args = parser.parse_args()
+
+    if args.shard_size is not None and args.shard_size < 1:
+        parser.error("--shard-size must be positive")
+
+    # only the scripts which have actually changed are re-rendered on each rebuild
+    options = BuildOptions(incremental=True, precompiled=args.precompile, shard_size=args.shard_size,
+                           catalog_db=args.catalog_db)
+    site = Site(source=args.in_file, options=options, strict_dates=args.strict_dates)
+
+    start = time.perf_counter()
+    site.run(set(STAGES))
+    print(f"built the site ({time.perf_counter() - start:.2f}s)")
+
+    notifier = ReloadNotifier()
+    handler = partial(DevRequestHandler, directory=str(ROOT), notifier=notifier)
+    server = ThreadingHTTPServer((args.host, args.port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"serving on http://{args.host}:{args.port}/ (Ctrl+C to stop)")
+
+    try:
+        watch(site, notifier)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
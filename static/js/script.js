@@ -81,6 +81,397 @@ function matchesTextFilter(scriptId, filterText) {
   return false;
 }
 
+// -----------------------------------------------------------------------------------------------------------------
+// search index for the text filter, built alongside the page (see meta/search_index.py)
+// -----------------------------------------------------------------------------------------------------------------
+
+// must split on exactly the same characters as TOKEN_SEPARATORS in meta/search_index.py
+const TOKEN_SEPARATORS = /[\s!-\/:-@\[-`{-~]+/;
+
+let searchIndexRequest = null;
+let searchIndex = null;
+let lastSearch = { filterText: "", matches: null };
+
+/**
+ * Fetch the search index for the page, if it has one. If it can't be loaded, the text filter falls back to reading
+ * each script's attributes.
+ * @returns {Promise<void>}
+ */
+function loadSearchIndex() {
+  if (searchIndexRequest === null) {
+    const url = document.getElementById("_scripts")?.getAttribute("data-search-index");
+
+    searchIndexRequest = (url ? fetch(url) : Promise.reject(new Error("no search index")))
+      .then((response) => {
+        if (!response.ok) {
+          throw new Error(`failed to load ${url}: ${response.status}`);
+        }
+        return response.json();
+      })
+      .then((index) => {
+        searchIndex = { texts: index.texts, tokens: Object.entries(index.tokens) };
+      })
+      .catch((error) => console.warn("text filter will scan the page instead:", error));
+  }
+
+  return searchIndexRequest;
+}
+
+/**
+ * Return the positions of the scripts matching the text filter, according to the search index.
+ * @param {String} filterText - the (lowercased) text to filter against
+ * @returns {Array<number>|null} - the matching positions, or null if every script matches
+ */
+function searchScripts(filterText) {
+  if (filterText === "") {
+    return null;
+  }
+
+  let candidates;
+  if (lastSearch.matches !== null && filterText.includes(lastSearch.filterText)) {
+    // anything matching the new filter text also matched the previous one (the usual case while typing)
+    candidates = lastSearch.matches;
+  } else {
+    // every word of the filter text must lie within some token of a matching script
+    candidates = null;
+    for (const word of filterText.split(TOKEN_SEPARATORS)) {
+      if (word === "") {
+        continue;
+      }
+
+      const found = new Set();
+      for (const [token, positions] of searchIndex.tokens) {
+        if (token.includes(word)) {
+          positions.forEach((i) => found.add(i));
+        }
+      }
+
+      candidates = candidates === null ? found : candidates.intersection(found);
+    }
+
+    if (candidates === null) {
+      // the filter text was all punctuation, so there's nothing to narrow the search with
+      candidates = searchIndex.texts.keys();
+    }
+  }
+
+  const matches = Array.from(candidates).filter((i) => searchIndex.texts[i].includes(filterText));
+  lastSearch = { filterText: filterText, matches: matches };
+
+  return matches;
+}
+
+// -----------------------------------------------------------------------------------------------------------------
+// facet index for the other filters, built alongside the page (see meta/facet_index.py)
+//
+// Sets of scripts are bitsets over the scripts' positions in the page, held as Uint32Arrays: the filters are
+// evaluated entirely with bitwise operations, and only the scripts whose visibility changes are touched in the page.
+// -----------------------------------------------------------------------------------------------------------------
+let facetIndexRequest = null;
+let facetIndex = null;
+// whether both index requests have finished (whether or not they succeeded)
+let indexesSettled = false;
+// the bitset of scripts shown on the page, or null if it has to be read from the page again
+let visibleScripts = null;
+
+/**
+ * Decode a bitset, as encoded by encode_bitset in meta/facet_index.py.
+ * @param {String} encoded - base64 of the bitset's little-endian 32-bit words
+ * @returns {Uint32Array}
+ */
+function decodeBitset(encoded) {
+  const bytes = Uint8Array.from(atob(encoded), (c) => c.charCodeAt(0));
+  const view = new DataView(bytes.buffer);
+  const words = new Uint32Array(bytes.length / 4);
+
+  for (let w = 0; w < words.length; w++) {
+    words[w] = view.getUint32(w * 4, true);
+  }
+
+  return words;
+}
+
+/**
+ * Decode every bitset in an object of them.
+ * @param {Object<String, String>} encoded
+ * @returns {Object<String, Uint32Array>}
+ */
+function decodeBitsets(encoded) {
+  return Object.fromEntries(Object.entries(encoded).map(([key, value]) => [key, decodeBitset(value)]));
+}
+
+/**
+ * Return a bitset containing every script (or none of them).
+ * @param {number} size - the number of scripts
+ * @param {boolean} full - whether every script should be included
+ * @returns {Uint32Array}
+ */
+function makeBitset(size, full) {
+  const words = new Uint32Array(Math.ceil(size / 32));
+
+  if (full) {
+    words.fill(0xffffffff);
+    if (size % 32 !== 0) {
+      words[words.length - 1] = (1 << size % 32) - 1;
+    }
+  }
+
+  return words;
+}
+
+/**
+ * Return a bitset of the given script positions.
+ * @param {Iterable<number>} positions
+ * @param {number} size - the number of scripts
+ * @returns {Uint32Array}
+ */
+function bitsetOf(positions, size) {
+  const words = makeBitset(size, false);
+
+  for (const i of positions) {
+    words[i >>> 5] |= 1 << (i & 31);
+  }
+
+  return words;
+}
+
+/**
+ * Return the complement of a bitset.
+ * @param {Uint32Array} bitset
+ * @param {number} size - the number of scripts
+ * @returns {Uint32Array}
+ */
+function complement(bitset, size) {
+  const words = makeBitset(size, true);
+
+  for (let w = 0; w < words.length; w++) {
+    words[w] &= ~bitset[w];
+  }
+
+  return words;
+}
+
+/**
+ * Return the union of the given bitsets.
+ * @param {Array<Uint32Array|undefined>} bitsets - any undefined entries are treated as empty
+ * @param {number} size - the number of scripts
+ * @returns {Uint32Array}
+ */
+function union(bitsets, size) {
+  const words = makeBitset(size, false);
+
+  for (const bitset of bitsets) {
+    if (bitset === undefined) {
+      continue;
+    }
+
+    for (let w = 0; w < words.length; w++) {
+      words[w] |= bitset[w];
+    }
+  }
+
+  return words;
+}
+
+/**
+ * Restrict a bitset (in place) to the scripts in another.
+ * @param {Uint32Array} bitset - the bitset to restrict
+ * @param {Uint32Array|undefined} other - the scripts to restrict to, treated as empty if undefined
+ */
+function intersectWith(bitset, other) {
+  for (let w = 0; w < bitset.length; w++) {
+    bitset[w] &= other === undefined ? 0 : other[w];
+  }
+}
+
+/**
+ * Call the given function with the position of every script in the bitset.
+ * @param {Uint32Array} bitset
+ * @param {function(number): void} callback
+ */
+function forEachPosition(bitset, callback) {
+  for (let w = 0; w < bitset.length; w++) {
+    let word = bitset[w];
+
+    while (word !== 0) {
+      const lowest = word & -word;
+      callback(w * 32 + 31 - Math.clz32(lowest));
+      word ^= lowest;
+    }
+  }
+}
+
+/**
+ * Return the first index in a sorted array whose value is not less than (or, if after is set, is greater than) the
+ * target value.
+ * @param {Array<number>} sorted
+ * @param {number} target
+ * @param {boolean} after
+ * @returns {number}
+ */
+function bisect(sorted, target, after) {
+  let lo = 0;
+  let hi = sorted.length;
+
+  while (lo < hi) {
+    const mid = (lo + hi) >>> 1;
+    if (sorted[mid] < target || (after && sorted[mid] === target)) {
+      lo = mid + 1;
+    } else {
+      hi = mid;
+    }
+  }
+
+  return lo;
+}
+
+/**
+ * Fetch the facet index for the page, if it has one.
+ * @returns {Promise<void>}
+ */
+function loadFacetIndex() {
+  if (facetIndexRequest === null) {
+    const url = document.getElementById("_scripts")?.getAttribute("data-facet-index");
+
+    facetIndexRequest = (url ? fetch(url) : Promise.reject(new Error("no facet index")))
+      .then((response) => {
+        if (!response.ok) {
+          throw new Error(`failed to load ${url}: ${response.status}`);
+        }
+        return response.json();
+      })
+      .then((index) => {
+        facetIndex = {
+          size: index.size,
+          ids: index.ids,
+          numFills: index.numFills,
+          audience: decodeBitsets(index.audience),
+          speakers: decodeBitsets(index.speakers),
+          series: decodeBitsets(index.series),
+          inSeries: decodeBitset(index.inSeries),
+          filledBy: decodeBitsets(index.filledBy),
+          filled: decodeBitset(index.filled),
+          nsfw: decodeBitset(index.nsfw),
+          wordcountOrder: index.wordcountOrder,
+          wordcounts: index.wordcounts,
+        };
+      })
+      .catch((error) => console.warn("filters will scan the page instead:", error));
+  }
+
+  return facetIndexRequest;
+}
+
+/**
+ * Return the scripts selected by the filters, using the search and facet indexes.
+ * @param {Object} filters - the filter values, as from readFilters
+ * @returns {Uint32Array} the bitset of selected scripts
+ */
+function selectScripts(filters) {
+  const index = facetIndex;
+  const size = index.size;
+  const selected = makeBitset(size, true);
+
+  // filter by title / tags / summary
+  const textMatches = searchScripts(filters.filterText);
+  if (textMatches !== null) {
+    intersectWith(selected, bitsetOf(textMatches, size));
+  }
+
+  // filter by word count
+  if (!Number.isNaN(filters.minSpokenWords) || !Number.isNaN(filters.maxSpokenWords)) {
+    const start = Number.isNaN(filters.minSpokenWords) ? 0 : bisect(index.wordcounts, filters.minSpokenWords, false);
+    const end = Number.isNaN(filters.maxSpokenWords) ? size : bisect(index.wordcounts, filters.maxSpokenWords, true);
+    intersectWith(selected, bitsetOf(index.wordcountOrder.slice(start, end), size));
+  }
+
+  // filter by filled status
+  intersectWith(
+    selected,
+    union(
+      [
+        filters.filledStatusFilter.includes("filled") ? index.filled : undefined,
+        filters.filledStatusFilter.includes("unfilled") ? complement(index.filled, size) : undefined,
+      ],
+      size,
+    ),
+  );
+
+  // filter by series
+  if (filters.seriesFilter === "(one-shots only)") {
+    intersectWith(selected, complement(index.inSeries, size));
+  } else if (filters.seriesFilter !== "") {
+    intersectWith(selected, index.series[filters.seriesFilter]);
+  }
+
+  // filter by audience / number of speakers
+  intersectWith(selected, union(filters.numSpeakersFilter.map((count) => index.speakers[count]), size));
+  intersectWith(selected, union(filters.audienceTagFilter.map((tag) => index.audience[tag]), size));
+
+  // filter by VAs filled
+  if (filters.filledByFilter !== "") {
+    intersectWith(selected, index.filledBy[filters.filledByFilter]);
+  }
+
+  // filter by SFW/NSFW status
+  intersectWith(
+    selected,
+    union(
+      [
+        filters.nsfwStatusFilter.includes("SFW") ? complement(index.nsfw, size) : undefined,
+        filters.nsfwStatusFilter.includes("NSFW") ? index.nsfw : undefined,
+      ],
+      size,
+    ),
+  );
+
+  return selected;
+}
+
+/**
+ * Show exactly the given scripts, only updating those whose visibility has changed, and update the counts.
+ * @param {Uint32Array} selected - the bitset of scripts to show
+ */
+function showScripts(selected) {
+  const index = facetIndex;
+
+  if (visibleScripts === null) {
+    // every script is shown when the page first loads, but the scripts may have been filtered on the page since
+    visibleScripts = makeBitset(index.size, false);
+    index.ids.forEach((id, i) => {
+      const element = document.getElementById(id);
+      if (element !== null && element.style.display !== "none") {
+        visibleScripts[i >>> 5] |= 1 << (i & 31);
+      }
+    });
+  }
+
+  const changed = selected.map((word, w) => word ^ visibleScripts[w]);
+  forEachPosition(changed, (i) => {
+    // scripts from a chunk which failed to load are not on the page
+    const element = document.getElementById(index.ids[i]);
+    if (element === null) {
+      return;
+    }
+
+    const shown = (selected[i >>> 5] >>> (i & 31)) & 1;
+    element.style.display = shown ? "block" : "none";
+  });
+  visibleScripts = selected;
+
+  let scriptsShown = 0;
+  let fillsShown = 0;
+  forEachPosition(selected, (i) => {
+    if (document.getElementById(index.ids[i]) !== null) {
+      scriptsShown += 1;
+      fillsShown += index.numFills[i];
+    }
+  });
+
+  document.getElementById("numScripts").textContent = scriptsShown;
+  document.getElementById("numFills").textContent = fillsShown;
+}
+
 /**
  * Determine whether the given series value matches the target value.
  * @param {String} target - the "target" value for the series title
@@ -138,19 +529,181 @@ function doArraysOverlap(arr1, arr2) {
   return set1.intersection(set2).size > 0;
 }
 
+// -----------------------------------------------------------------------------------------------------------------
+// sharded index pages: scripts beyond the first few are loaded in chunks, either as the reader scrolls towards the
+// end of the page or all at once when a filter needs them
+// -----------------------------------------------------------------------------------------------------------------
+let pendingChunks = null;
+let chunkQueue = Promise.resolve();
+
+/**
+ * Return the URLs of the script chunks which have not been loaded yet.
+ * @returns {Array<String>}
+ */
+function getPendingChunks() {
+  if (pendingChunks === null) {
+    const chunks = document.getElementById("_scripts")?.getAttribute("data-chunks");
+    pendingChunks = chunks ? chunks.split(" ") : [];
+  }
+
+  return pendingChunks;
+}
+
+/**
+ * Fetch the next chunk of scripts and append it to the page. Chunks are always appended in order.
+ * @returns {Promise<boolean>} whether there was a chunk left to load
+ */
+function loadNextChunk() {
+  chunkQueue = chunkQueue.then(async () => {
+    const url = getPendingChunks()[0];
+    if (url === undefined) {
+      return false;
+    }
+
+    let html;
+    try {
+      const response = await fetch(url);
+      if (!response.ok) {
+        throw new Error(`failed to load ${url}: ${response.status}`);
+      }
+      html = await response.text();
+    } catch (error) {
+      // give up on the remaining chunks rather than leaving the filters waiting on them forever
+      console.error(error);
+      pendingChunks = [];
+      return false;
+    }
+
+    const root = document.getElementById("_scripts");
+    const before = root.childElementCount;
+    root.insertAdjacentHTML("beforeend", html);
+    getPendingChunks().shift();
+
+    // the page only attaches its unblur handlers on load, so attach them to the new scripts here
+    for (const element of Array.from(root.children).slice(before)) {
+      if (element.classList.contains("blurred")) {
+        element.onclick = function () {
+          element.classList.remove("blurred");
+        };
+      }
+    }
+
+    return true;
+  });
+
+  return chunkQueue;
+}
+
+/**
+ * Load every remaining chunk of scripts.
+ * @returns {Promise<void>}
+ */
+async function loadAllChunks() {
+  while (await loadNextChunk()) {}
+}
+
+/**
+ * Load the next chunk of scripts whenever the last loaded script comes close to being on screen.
+ */
+function observeScriptChunks() {
+  if (getPendingChunks().length === 0) {
+    return;
+  }
+
+  const observer = new IntersectionObserver(
+    (entries) => {
+      if (!entries.some((entry) => entry.isIntersecting)) {
+        return;
+      }
+
+      observer.disconnect();
+      loadNextChunk().then((loaded) => {
+        if (loaded && getPendingChunks().length > 0) {
+          observer.observe(document.querySelector("#_scripts > .script-data:last-of-type"));
+        }
+      });
+    },
+    { rootMargin: "2000px" },
+  );
+
+  observer.observe(document.querySelector("#_scripts > .script-data:last-of-type"));
+}
+
+document.addEventListener("DOMContentLoaded", observeScriptChunks);
+
+/**
+ * Scroll to the script named by the URL's fragment (e.g., from a link on all-fills.html), loading chunks of scripts
+ * until it is on the page (or there are none left).
+ * @returns {Promise<void>}
+ */
+async function revealLinkedScript() {
+  const id = decodeURIComponent(location.hash.slice(1));
+  if (id === "" || document.getElementById(id) !== null) {
+    // the browser scrolls to anything already on the page by itself
+    return;
+  }
+
+  while (document.getElementById(id) === null && (await loadNextChunk())) {}
+  document.getElementById(id)?.scrollIntoView();
+}
+
+document.addEventListener("DOMContentLoaded", revealLinkedScript);
+window.addEventListener("hashchange", revealLinkedScript);
+
+/**
+ * Read the current value of every filter on the page.
+ * @returns {Object}
+ */
+function readFilters() {
+  return {
+    filterText: document.getElementById("filterInput").value.trim().toLowerCase(),
+    minSpokenWords: document.getElementById("filterWordCountMin").valueAsNumber,
+    maxSpokenWords: document.getElementById("filterWordCountMax").valueAsNumber,
+    seriesFilter: document.getElementById("seriesFilter").value,
+    audienceTagFilter: getCheckedIn("audienceTagFilter"),
+    filledByFilter: document.getElementById("filledByFilter").value,
+    numSpeakersFilter: getCheckedIn("numSpeakersFilter"),
+    filledStatusFilter: getCheckedIn("filledStatusFilter"),
+    nsfwStatusFilter: getCheckedIn("nsfwFilter"),
+  };
+}
+
 function filterScripts() {
-  const filterText = document.getElementById("filterInput").value.trim().toLowerCase();
-  const minSpokenWords = document.getElementById("filterWordCountMin").valueAsNumber;
-  const maxSpokenWords = document.getElementById("filterWordCountMax").valueAsNumber;
-  const seriesFilter = document.getElementById("seriesFilter").value;
-  const audienceTagFilter = getCheckedIn("audienceTagFilter");
-  const filledByFilter = document.getElementById("filledByFilter").value;
-  const numSpeakersFilter = getCheckedIn("numSpeakersFilter");
-  const filledStatusFilter = getCheckedIn("filledStatusFilter");
-  const nsfwStatusFilter = getCheckedIn("nsfwFilter");
+  if (getPendingChunks().length > 0) {
+    // filters apply to every script, so make sure they are all on the page first
+    loadAllChunks().then(filterScripts);
+    return;
+  }
+
+  if (!indexesSettled) {
+    // wait for the indexes even if they have already been requested, rather than filtering on the page meanwhile
+    Promise.all([loadSearchIndex(), loadFacetIndex()]).then(() => {
+      indexesSettled = true;
+      filterScripts();
+    });
+    return;
+  }
+
+  const filters = readFilters();
+
+  if (searchIndex !== null && facetIndex !== null) {
+    showScripts(selectScripts(filters));
+  } else {
+    filterScriptsOnPage(filters);
+  }
+}
 
+/**
+ * Apply the filters by reading the attributes of each script on the page. This is the fallback for when the search
+ * and facet indexes are unavailable.
+ * @param {Object} filters - the filter values, as from readFilters
+ */
+function filterScriptsOnPage(filters) {
   let scriptIds = getScriptIds();
 
+  // the scripts shown are changed behind showScripts' back, so it has to read them from the page next time
+  visibleScripts = null;
+
   let scriptsShown = 0;
   let fillsShown = 0;
 
@@ -160,7 +713,7 @@ function filterScripts() {
     // -----------------------------------------------------------------------------------------------------------
     // filter by title / tags / summary
     // -----------------------------------------------------------------------------------------------------------
-    if (!matchesTextFilter(id, filterText)) {
+    if (!matchesTextFilter(id, filters.filterText)) {
       script.style.display = "none";
       continue;
     }
@@ -170,12 +723,12 @@ function filterScripts() {
     // -----------------------------------------------------------------------------------------------------------
     const wordcount = +script.getAttribute("data-wordcount");
 
-    if (minSpokenWords !== NaN && wordcount < minSpokenWords) {
+    if (filters.minSpokenWords !== NaN && wordcount < filters.minSpokenWords) {
       script.style.display = "none";
       continue;
     }
 
-    if (maxSpokenWords !== NaN && wordcount > maxSpokenWords) {
+    if (filters.maxSpokenWords !== NaN && wordcount > filters.maxSpokenWords) {
       script.style.display = "none";
       continue;
     }
@@ -184,12 +737,12 @@ function filterScripts() {
     // filter by filled status
     // -----------------------------------------------------------------------------------------------------------
     const numFills = +script.getAttribute("data-numFills");
-    if (numFills === 0 && !filledStatusFilter.includes("unfilled")) {
+    if (numFills === 0 && !filters.filledStatusFilter.includes("unfilled")) {
       script.style.display = "none";
       continue;
     }
 
-    if (numFills > 0 && !filledStatusFilter.includes("filled")) {
+    if (numFills > 0 && !filters.filledStatusFilter.includes("filled")) {
       script.style.display = "none";
       continue;
     }
@@ -198,7 +751,7 @@ function filterScripts() {
     // filter by series
     // -----------------------------------------------------------------------------------------------------------
     const series = script.getAttribute("data-series");
-    if (!matchesSeries(seriesFilter, series)) {
+    if (!matchesSeries(filters.seriesFilter, series)) {
       script.style.display = "none";
       continue;
     }
@@ -209,12 +762,12 @@ function filterScripts() {
     const audiences = script.getAttribute("data-audience").split(",");
     const numSpeakers = audiences.map((audience) => extractSpeakers(audience).length.toString());
 
-    if (!doArraysOverlap(numSpeakersFilter, numSpeakers)) {
+    if (!doArraysOverlap(filters.numSpeakersFilter, numSpeakers)) {
       script.style.display = "none";
       continue;
     }
 
-    if (!doArraysOverlap(audiences, audienceTagFilter)) {
+    if (!doArraysOverlap(audiences, filters.audienceTagFilter)) {
       script.style.display = "none";
       continue;
     }
@@ -223,7 +776,7 @@ function filterScripts() {
     // filter by VAs filled
     // -----------------------------------------------------------------------------------------------------------
     const filledBy = script.getAttribute("data-VAsFilled").split("===");
-    if (filledByFilter !== "" && !filledBy.includes(filledByFilter)) {
+    if (filters.filledByFilter !== "" && !filledBy.includes(filters.filledByFilter)) {
       script.style.display = "none";
       continue;
     }
@@ -232,7 +785,7 @@ function filterScripts() {
     // filter by SFW/NSFW status
     // -----------------------------------------------------------------------------------------------------------
     nsfwStatus = script.getAttribute("data-nsfw");
-    if (!nsfwStatusFilter.includes(nsfwStatus)) {
+    if (!filters.nsfwStatusFilter.includes(nsfwStatus)) {
       script.style.display = "none";
       continue;
     }